@@ -1,3 +1,4 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.admin import TabularInline
 
@@ -11,6 +12,7 @@ from airport.models import (
     Ticket,
     Route,
 )
+from airport.rosters import Duty, describe_conflict, find_crew_conflicts
 
 
 admin.site.register(Airport)
@@ -25,8 +27,30 @@ class RouteAdmin(admin.ModelAdmin):
     search_fields = ("source__name", "destination__name")
 
 
+class FlightAdminForm(forms.ModelForm):
+    def clean(self):
+        data = super().clean()
+        if not {"departure_time", "arrival_time"} <= data.keys():
+            return data
+        duty = Duty(
+            self.instance.id,
+            data["departure_time"],
+            data["arrival_time"],
+            True,
+        )
+        crew = {member.id: member for member in data.get("crew", ())}
+        for crew_id, first, second in find_crew_conflicts(
+            (crew_id, duty) for crew_id in crew
+        ):
+            self.add_error(
+                "crew", describe_conflict(crew[crew_id], first, second)
+            )
+        return data
+
+
 @admin.register(Flight)
 class FlightAdmin(admin.ModelAdmin):
+    form = FlightAdminForm
     autocomplete_fields = ("route",)
     search_fields = (
         "route",
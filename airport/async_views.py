@@ -0,0 +1,175 @@
+"""Async versions of the hot flight read endpoints.
+
+Under an ASGI server they wait for the database, the cache and slow
+clients without holding a thread per request. They are public and
+read-only like the sync endpoints, but bypass DRF request handling,
+so there is no authentication on them. The configured DRF throttles
+apply by client address.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from airport.holds import aget_seatmap_with_holds
+from airport.models import Flight
+from airport.pagination import FlightPagination
+from airport.serializers import (
+    FlightListSerializer,
+    FlightDetailSerializer,
+    FlightSeatmapDetailSerializer,
+)
+from airport.views import FlightViewSet, search_flights, with_available_seats
+from airport_service.metrics import timed_data
+
+
+def not_found():
+    return JsonResponse({"detail": "Not found."}, status=404)
+
+
+def throttle_waits(request):
+    """Waits of the configured DRF throttles refusing the request. The
+    request is anonymous to them, so they limit each client address."""
+    request = Request(request, authenticators=())
+    throttles = [
+        throttle_class()
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES
+    ]
+    return [
+        throttle.wait()
+        for throttle in throttles
+        if not throttle.allow_request(request, None)
+    ]
+
+
+def throttled(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # the throttle history lives in the cache, read it off the loop
+        if waits := await sync_to_async(throttle_waits)(request):
+            error = Throttled(
+                max((wait for wait in waits if wait is not None), default=None)
+            )
+            response = JsonResponse(
+                {"detail": error.detail}, status=error.status_code
+            )
+            if error.wait is not None:
+                response["Retry-After"] = str(error.wait)
+            return response
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def encode_cursor(flight):
+    position = f"{flight.departure_time.isoformat()}|{flight.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        departure_time, flight_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(departure_time), int(flight_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def page_size(params):
+    size = params.get(FlightPagination.page_size_query_param, "")
+    if size.isdigit() and int(size) > 0:
+        return min(int(size), FlightPagination.max_page_size)
+    return FlightPagination.page_size
+
+
+@require_safe
+@throttled
+async def flight_list(request):
+    """Flights in departure order with the same filters as the sync list,
+    paginated by a cursor of the last departure time and id"""
+    params = request.GET
+    size = page_size(params)
+    queryset = search_flights(
+        with_available_seats(FlightViewSet.queryset), params
+    ).order_by(*FlightPagination.ordering)
+    if cursor := params.get("cursor"):
+        try:
+            departure_time, flight_id = decode_cursor(cursor)
+        except ValueError:
+            return JsonResponse({"detail": "Invalid cursor"}, status=404)
+        queryset = queryset.filter(
+            Q(departure_time__gt=departure_time)
+            | Q(departure_time=departure_time, id__gt=flight_id)
+        )
+
+    try:
+        flights = [flight async for flight in queryset[: size + 1]]
+    except ValidationError as error:
+        return JsonResponse({"detail": error.messages}, status=400)
+
+    next_url = None
+    if len(flights) > size:
+        flights = flights[:size]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", encode_cursor(flights[-1])
+        )
+    serializer = FlightListSerializer(
+        flights, many=True, context={"request": request}
+    )
+    return JsonResponse(
+        {
+            "next": next_url,
+            "previous": None,
+            "results": timed_data(request, serializer),
+        }
+    )
+
+
+@require_safe
+@throttled
+async def flight_detail(request, pk):
+    queryset = with_available_seats(FlightViewSet.queryset)
+    with_seatmap = request.GET.get("seatmap") in ("true", "1")
+    if not with_seatmap:
+        queryset = queryset.prefetch_related("tickets")
+    try:
+        flight = await queryset.aget(pk=pk)
+    except Flight.DoesNotExist:
+        return not_found()
+
+    if with_seatmap:
+        serializer = FlightSeatmapDetailSerializer(
+            flight,
+            context={
+                "request": request,
+                "seatmap": await aget_seatmap_with_holds(flight),
+            },
+        )
+    else:
+        serializer = FlightDetailSerializer(
+            flight, context={"request": request}
+        )
+    return JsonResponse(timed_data(request, serializer))
+
+
+@require_safe
+@throttled
+async def flight_seatmap(request, pk):
+    """Sold and held seats of the flight as base64 bitmaps"""
+    try:
+        flight = await Flight.objects.select_related("airplane").aget(pk=pk)
+    except Flight.DoesNotExist:
+        return not_found()
+    return JsonResponse(await aget_seatmap_with_holds(flight))
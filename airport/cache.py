@@ -0,0 +1,151 @@
+import hashlib
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from redis import RedisError
+from rest_framework.response import Response
+
+from airport_service.routers import use_primary
+
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+REFERENCE_CACHE_NAMES = ("airports", "routes", "airplane_types", "airplanes")
+SHARED_STAMP_NAMES = REFERENCE_CACHE_NAMES + (
+    "crew",
+    "flights",
+    "flight-schedule",
+    "itineraries",
+)
+# stamps of single flights and orders, one pair of keys per object. An
+# expired stamp starts a fresh version, which only costs one full response
+OBJECT_STAMP_TIMEOUT = 24 * 60 * 60
+
+
+def version_key(name):
+    return f"reference-version-{name}"
+
+
+def stats_key(name, outcome):
+    return f"reference-stats-{name}-{outcome}"
+
+
+def modified_key(name):
+    return f"reference-modified-{name}"
+
+
+def stamp_timeout(name):
+    return None if name in SHARED_STAMP_NAMES else OBJECT_STAMP_TIMEOUT
+
+
+def get_version(name):
+    # a fresh version starts from the current time, so entries written
+    # before the version key was evicted can never be read again
+    return cache.get_or_set(version_key(name), time.time_ns, None)
+
+
+def get_stamps(names):
+    """Versions of the names and the time of the latest change among them,
+    in one round trip. Missing names start a fresh version now."""
+    keys = [version_key(name) for name in names]
+    keys += [modified_key(name) for name in names]
+    values = cache.get_many(keys)
+    now = time.time_ns()
+    missing = defaultdict(dict)
+    for name in names:
+        if version_key(name) not in values:
+            missing[stamp_timeout(name)][version_key(name)] = now
+        if modified_key(name) not in values:
+            missing[stamp_timeout(name)][modified_key(name)] = now / 1e9
+    for timeout, stamps in missing.items():
+        cache.set_many(stamps, timeout)
+        values.update(stamps)
+    return (
+        [values[version_key(name)] for name in names],
+        max(values[modified_key(name)] for name in names),
+    )
+
+
+def bump_versions(*names):
+    def bump():
+        for name in names:
+            try:
+                cache.incr(version_key(name))
+            except ValueError:
+                cache.set(
+                    version_key(name), time.time_ns(), stamp_timeout(name)
+                )
+            except RedisError:
+                pass
+        modified = defaultdict(dict)
+        for name in names:
+            modified[stamp_timeout(name)][modified_key(name)] = time.time()
+        try:
+            for timeout, stamps in modified.items():
+                cache.set_many(stamps, timeout)
+        except RedisError:
+            pass
+
+    transaction.on_commit(bump)
+
+
+def count(name, outcome):
+    try:
+        cache.incr(stats_key(name, outcome))
+    except ValueError:
+        cache.set(stats_key(name, outcome), 1, None)
+
+
+def get_stats():
+    keys = {
+        stats_key(name, outcome): (name, outcome)
+        for name in REFERENCE_CACHE_NAMES
+        for outcome in ("hit", "miss")
+    }
+    values = cache.get_many(keys)
+    stats = {name: {"hit": 0, "miss": 0} for name in REFERENCE_CACHE_NAMES}
+    for key, (name, outcome) in keys.items():
+        stats[name][outcome] = values.get(key, 0)
+    return stats
+
+
+class CachedReadMixin:
+    """Caches serialized list and retrieve responses of the viewset.
+
+    Keys carry the version of `cache_name`, which is bumped when
+    the underlying models change, so stale entries are never read.
+    """
+
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def cached(self, view, request, *args, **kwargs):
+        try:
+            url = request.build_absolute_uri().encode()
+            key = (
+                f"reference-{self.cache_name}-"
+                f"{get_version(self.cache_name)}-"
+                f"{hashlib.md5(url).hexdigest()}"
+            )
+            data = cache.get(key)
+            count(self.cache_name, "miss" if data is None else "hit")
+        except RedisError:
+            return view(request, *args, **kwargs)
+
+        if data is not None:
+            return Response(data)
+        # cached under the current version, a replica may not have it yet
+        with use_primary():
+            response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(key, response.data, REFERENCE_CACHE_TIMEOUT)
+            except RedisError:
+                pass
+        return response
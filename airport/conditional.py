@@ -0,0 +1,81 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from redis import RedisError
+
+from airport.cache import REFERENCE_CACHE_NAMES, get_stamps
+
+
+def flight_stamp(flight_id):
+    return f"flight-{flight_id}"
+
+
+def order_stamp(order_id):
+    return f"order-{order_id}"
+
+
+def user_orders_stamp(user_id):
+    return f"orders-{user_id}"
+
+
+# shown by name in flight responses, next to the reference data
+FLIGHT_STAMPS = ("crew",) + REFERENCE_CACHE_NAMES
+# orders show their flights as "route (departure time)"
+ORDER_STAMPS = ("flight-schedule", "routes", "airports")
+
+
+def conditional_get(stamp_names):
+    """ETag and Last-Modified for a list or retrieve viewset method,
+    computed from the version stamps named by
+    stamp_names(request, **kwargs). Unchanged stamps answer
+    304 Not Modified before the queryset or the serializer run.
+    Methods returning no names are served as usual."""
+
+    def stamps(request, **kwargs):
+        if not hasattr(request, "version_stamps"):
+            request.version_stamps = None
+            if names := stamp_names(request, **kwargs):
+                try:
+                    versions, modified = get_stamps(names)
+                except RedisError:
+                    return None
+                # a replica may still serve the data from before the
+                # change, which must not be remembered under the new tag
+                if (
+                    len(settings.DATABASES) == 1
+                    or time.time() - modified > settings.DATABASE_REPLICA_LAG
+                ):
+                    request.version_stamps = (names, versions, modified)
+        return request.version_stamps
+
+    def etag(request, *args, **kwargs):
+        if (version_stamps := stamps(request, **kwargs)) is None:
+            return None
+        names, versions, _ = version_stamps
+        # the same url renders differently by user and accepted format
+        content = "|".join(
+            map(
+                str,
+                (
+                    request.get_full_path(),
+                    request.META.get("HTTP_ACCEPT", ""),
+                    request.user.pk,
+                    *names,
+                    *versions,
+                ),
+            )
+        )
+        return hashlib.md5(content.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if (version_stamps := stamps(request, **kwargs)) is None:
+            return None
+        return datetime.fromtimestamp(version_stamps[2], tz=timezone.utc)
+
+    return method_decorator(
+        condition(etag_func=etag, last_modified_func=last_modified)
+    )
@@ -0,0 +1,367 @@
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+from airport.cache import REFERENCE_CACHE_NAMES, bump_versions
+from airport.models import (
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Crew,
+    Flight,
+    Order,
+    Ticket,
+)
+from airport.search_index import refresh_search_index
+
+# name, rows, seats in row and how common the airplane type is
+AIRPLANE_MODELS = (
+    ("Regional jet", 20, 4, 2),
+    ("Narrow-body", 30, 6, 5),
+    ("Wide-body", 45, 9, 1),
+)
+FIRST_NAMES = (
+    "Anna",
+    "Daniel",
+    "Emma",
+    "Ivan",
+    "Julia",
+    "Mark",
+    "Olena",
+    "Peter",
+    "Sofia",
+    "Taras",
+)
+LAST_NAMES = (
+    "Bondar",
+    "Garcia",
+    "Kowalski",
+    "Miller",
+    "Novak",
+    "Petrenko",
+    "Schmidt",
+    "Smith",
+)
+# passengers per order and how common each size is
+ORDER_SIZES = ((1, 2, 3, 4), (5, 3, 1, 1))
+CRUISE_SPEED = 800  # km/h
+MIN_TURNAROUND = 45  # minutes
+SYNTHETIC_PASSWORD = "synthetic"
+
+
+def distance_between(first, second):
+    """Great-circle distance in km between (latitude, longitude) points"""
+    latitude1, longitude1 = map(math.radians, first)
+    latitude2, longitude2 = map(math.radians, second)
+    haversine = (
+        math.sin((latitude2 - latitude1) / 2) ** 2
+        + math.cos(latitude1)
+        * math.cos(latitude2)
+        * math.sin((longitude2 - longitude1) / 2) ** 2
+    )
+    return max(round(12742 * math.asin(math.sqrt(haversine))), 100)
+
+
+def reserve_ids(model, count):
+    """Take ids from the sequence of the model, for rows that are copied
+    together with the rows referencing them"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            (model._meta.db_table, model._meta.pk.column, count),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_rows(model, fields, rows):
+    """Insert rows with COPY, which skips the per-row INSERT overhead"""
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        quote(model._meta.get_field(field).column) for field in fields
+    )
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+class DatasetGenerator:
+    """Generates a schedule that looks like a real one: popular airports
+    get more routes, airplanes fly chains of flights without overlaps,
+    each airplane keeps one crew, and flights sell seats around the
+    load factor. The same seed and start give the same data."""
+
+    def __init__(
+        self,
+        start,
+        seed=0,
+        airports=50,
+        routes_per_airport=8,
+        airplanes=100,
+        flights=10000,
+        days=90,
+        crew_per_flight=4,
+        users=1000,
+        load_factor=0.8,
+        batch_size=1000,
+        prefix="Synthetic",
+    ):
+        self.random = random.Random(seed)
+        self.start = start
+        self.airports_count = airports
+        self.routes_per_airport = min(routes_per_airport, airports - 1)
+        self.airplanes_count = airplanes
+        self.flights_count = flights
+        self.days = days
+        self.crew_per_flight = crew_per_flight
+        self.users_count = users
+        self.load_factor = load_factor
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.counts = dict.fromkeys(("flights", "orders", "tickets"), 0)
+
+    def generate(self):
+        self.create_airports()
+        self.create_routes()
+        self.create_airplanes()
+        self.create_crew()
+        self.create_users()
+        batch = []
+        for flight in self.schedule():
+            batch.append(flight)
+            if len(batch) == self.batch_size:
+                self.save_flights(batch)
+                batch = []
+        if batch:
+            self.save_flights(batch)
+
+        refresh_search_index(
+            Flight.objects.filter(airplane_id__in=self.airplanes)
+        )
+        # fresh statistics, so the planner sees the new volume
+        with connection.cursor() as cursor:
+            for model in (Route, Flight, Order, Ticket):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f"ANALYZE {table}")
+        bump_versions(
+            *REFERENCE_CACHE_NAMES,
+            "crew",
+            "flights",
+            "flight-schedule",
+            "itineraries",
+        )
+        return self.counts
+
+    def create_airports(self):
+        airports = Airport.objects.bulk_create(
+            Airport(
+                name=f"{self.prefix} Airport {i}",
+                closest_city=f"{self.prefix} City {i}",
+            )
+            for i in range(self.airports_count)
+        )
+        self.airport_ids = [airport.id for airport in airports]
+        self.locations = [
+            (self.random.uniform(-50, 60), self.random.uniform(-130, 150))
+            for _ in airports
+        ]
+        # a few hubs and a long tail, like real traffic
+        self.popularity = [1 / (i + 1) for i in range(len(airports))]
+
+    def create_routes(self):
+        destinations = [set() for _ in range(self.airports_count)]
+        for source in range(self.airports_count):
+            while len(destinations[source]) < self.routes_per_airport:
+                destination = self.random.choices(
+                    range(self.airports_count), self.popularity
+                )[0]
+                if destination != source:
+                    destinations[source].add(destination)
+                    destinations[destination].add(source)
+        pairs = [
+            (source, destination)
+            for source in range(self.airports_count)
+            for destination in sorted(destinations[source])
+        ]
+        routes = Route.objects.bulk_create(
+            Route(
+                source_id=self.airport_ids[source],
+                destination_id=self.airport_ids[destination],
+                distance=distance_between(
+                    self.locations[source], self.locations[destination]
+                ),
+            )
+            for source, destination in pairs
+        )
+        self.routes_from = {}
+        for (source, destination), route in zip(pairs, routes):
+            self.routes_from.setdefault(source, []).append(
+                (route.id, destination, route.distance)
+            )
+
+    def create_airplanes(self):
+        airplane_types = {
+            name: AirplaneType.objects.get_or_create(
+                name=f"{self.prefix} {name}"
+            )[0]
+            for name, *_ in AIRPLANE_MODELS
+        }
+        models = self.random.choices(
+            AIRPLANE_MODELS,
+            [weight for *_, weight in AIRPLANE_MODELS],
+            k=self.airplanes_count,
+        )
+        airplanes = Airplane.objects.bulk_create(
+            Airplane(
+                name=f"{self.prefix} Airplane {i}",
+                rows=rows,
+                seats_in_row=seats_in_row,
+                airplane_type=airplane_types[name],
+            )
+            for i, (name, rows, seats_in_row, _) in enumerate(models)
+        )
+        self.airplanes = {
+            airplane.id: (airplane.rows, airplane.seats_in_row)
+            for airplane in airplanes
+        }
+
+    def create_crew(self):
+        """Every airplane keeps its own crew, so crew never overlap"""
+        crew = Crew.objects.bulk_create(
+            Crew(
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=f"{self.random.choice(LAST_NAMES)}-{i}",
+            )
+            for i in range(self.airplanes_count * self.crew_per_flight)
+        )
+        crew_ids = [member.id for member in crew]
+        size = self.crew_per_flight
+        self.crews = {
+            airplane_id: crew_ids[index * size : (index + 1) * size]
+            for index, airplane_id in enumerate(self.airplanes)
+        }
+
+    def create_users(self):
+        password = make_password(SYNTHETIC_PASSWORD)
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(
+                email=f"{self.prefix.lower()}{i}@example.com",
+                password=password,
+            )
+            for i in range(self.users_count)
+        )
+        self.user_ids = [user.id for user in users]
+
+    def schedule(self):
+        """Flights of each airplane in turn, spread over the date range"""
+        window = self.days * 24 * 60
+        for index, airplane_id in enumerate(self.airplanes):
+            count = self.flights_count // self.airplanes_count + (
+                index < self.flights_count % self.airplanes_count
+            )
+            if not count:
+                continue
+            slot = window / count
+            airport = self.random.choices(
+                range(self.airports_count), self.popularity
+            )[0]
+            available = self.start
+            for number in range(count):
+                route_id, destination, distance = self.random.choice(
+                    self.routes_from[airport]
+                )
+                planned = self.start + timedelta(
+                    minutes=(number + self.random.random()) * slot
+                )
+                departure_time = max(planned, available).replace(
+                    second=0, microsecond=0
+                )
+                duration = timedelta(
+                    minutes=5 * round(distance / CRUISE_SPEED * 12 + 6)
+                )
+                arrival_time = departure_time + duration
+                available = arrival_time + timedelta(minutes=MIN_TURNAROUND)
+                airport = destination
+                yield (route_id, airplane_id, departure_time, arrival_time)
+
+    def save_flights(self, batch):
+        flight_ids = reserve_ids(Flight, len(batch))
+        flights, crew_links, orders, tickets = [], [], [], []
+        for flight_id, (route_id, airplane_id, departure, arrival) in zip(
+            flight_ids, batch
+        ):
+            rows, seats_in_row = self.airplanes[airplane_id]
+            capacity = rows * seats_in_row
+            sold = 0
+            if self.user_ids:
+                sold = min(
+                    capacity,
+                    round(
+                        capacity
+                        * self.load_factor
+                        * self.random.uniform(0.7, 1.3)
+                    ),
+                )
+            seats = self.random.sample(range(capacity), sold)
+            while seats:
+                size = self.random.choices(*ORDER_SIZES)[0]
+                created_at = departure - timedelta(
+                    minutes=self.random.randint(60, 90 * 24 * 60)
+                )
+                orders.append((created_at, self.random.choice(self.user_ids)))
+                for seat in seats[:size]:
+                    tickets.append(
+                        (
+                            seat // seats_in_row + 1,
+                            seat % seats_in_row + 1,
+                            flight_id,
+                            len(orders) - 1,
+                        )
+                    )
+                del seats[:size]
+            flights.append(
+                (flight_id, route_id, airplane_id, departure, arrival, sold)
+            )
+            crew_links.extend(
+                (flight_id, crew_id)
+                for crew_id in self.crews.get(airplane_id, ())
+            )
+
+        copy_rows(
+            Flight,
+            (
+                "id",
+                "route",
+                "airplane",
+                "departure_time",
+                "arrival_time",
+                "sold_seats",
+            ),
+            flights,
+        )
+        copy_rows(Flight.crew.through, ("flight", "crew"), crew_links)
+        order_ids = reserve_ids(Order, len(orders)) if orders else []
+        copy_rows(
+            Order,
+            ("id", "created_at", "user"),
+            ((order_id, *order) for order_id, order in zip(order_ids, orders)),
+        )
+        copy_rows(
+            Ticket,
+            ("row", "seat", "flight", "order"),
+            (
+                (row, seat, flight_id, order_ids[order])
+                for row, seat, flight_id, order in tickets
+            ),
+        )
+        self.counts["flights"] += len(flights)
+        self.counts["orders"] += len(orders)
+        self.counts["tickets"] += len(tickets)
@@ -0,0 +1,86 @@
+import csv
+import json
+from datetime import datetime
+
+from airport.models import Flight, Order, Ticket
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORTS = {
+    "flights": (
+        Flight.objects.order_by("id"),
+        {
+            "id": "id",
+            "source": "route__source__name",
+            "source_city": "route__source__closest_city",
+            "destination": "route__destination__name",
+            "destination_city": "route__destination__closest_city",
+            "airplane": "airplane__name",
+            "airplane_type": "airplane__airplane_type__name",
+            "departure_time": "departure_time",
+            "arrival_time": "arrival_time",
+            "sold_seats": "sold_seats",
+        },
+    ),
+    "orders": (
+        Order.objects.order_by("id"),
+        {
+            "id": "id",
+            "created_at": "created_at",
+            "user": "user__email",
+        },
+    ),
+    "tickets": (
+        Ticket.objects.order_by("id"),
+        {
+            "id": "id",
+            "order": "order_id",
+            "user": "order__user__email",
+            "flight": "flight_id",
+            "source": "flight__route__source__name",
+            "source_city": "flight__route__source__closest_city",
+            "destination": "flight__route__destination__name",
+            "destination_city": "flight__route__destination__closest_city",
+            "departure_time": "flight__departure_time",
+            "row": "row",
+            "seat": "seat",
+        },
+    ),
+}
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+class Echo:
+    """File-like object that returns written value instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def serialize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(name, chunk_size=EXPORT_CHUNK_SIZE):
+    queryset, columns = EXPORTS[name]
+    rows = queryset.values_list(*columns.values())
+    return list(columns), rows.iterator(chunk_size=chunk_size)
+
+
+def export_lines(name, file_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield export of the model line by line, without loading
+    the whole table into memory"""
+    columns, rows = export_rows(name, chunk_size)
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(map(serialize_value, row))
+    else:
+        for row in rows:
+            yield json.dumps(
+                dict(zip(columns, map(serialize_value, row)))
+            ) + "\n"
@@ -0,0 +1,347 @@
+import base64
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.utils import timezone
+from redis import RedisError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from airport.seatmap import aget_seatmap, get_seatmap, pack_seatmap
+
+
+HOLD_MAX_MINUTES = 15
+ORDER_CLAIM_TIMEOUT = 60
+
+
+class SeatHoldsUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Seat holds are unavailable, please try again later."
+    default_code = "seat_holds_unavailable"
+
+
+def seat_key(flight_id, row, seat):
+    return f"seat-hold-{flight_id}-{row}-{seat}"
+
+
+def hold_key(token):
+    return f"seat-hold-token-{token}"
+
+
+def flight_holds_key(flight_id):
+    return f"seat-holds-{flight_id}"
+
+
+def backend_key(key):
+    return caches["default"].make_and_validate_key(key)
+
+
+def holds_client():
+    """Raw client of the Redis cache, None for other cache backends,
+    which read held seats key by key."""
+    backend = caches["default"]
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+def index_seats(seats, timeout):
+    """Add held or claimed seats to the sorted set of their flight,
+    scored by expiry time. The seat keys stay the source of truth,
+    the set only lets a seat map read the holds of a flight at once."""
+    client = holds_client()
+    if client is None or not seats:
+        return
+    now = time.time()
+    members = defaultdict(dict)
+    for flight_id, row, seat in seats:
+        members[flight_id][f"{row}-{seat}"] = now + timeout
+    try:
+        pipeline = client.pipeline()
+        for flight_id, scores in members.items():
+            key = backend_key(flight_holds_key(flight_id))
+            pipeline.zremrangebyscore(key, "-inf", now)
+            pipeline.zadd(key, scores)
+            pipeline.expire(key, HOLD_MAX_MINUTES * 60)
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def unindex_seats(seats):
+    client = holds_client()
+    if client is None or not seats:
+        return
+    members = defaultdict(list)
+    for flight_id, row, seat in seats:
+        members[flight_id].append(f"{row}-{seat}")
+    try:
+        pipeline = client.pipeline()
+        for flight_id, names in members.items():
+            pipeline.zrem(backend_key(flight_holds_key(flight_id)), *names)
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def seat_error(row, seat, flight_id, message):
+    return ValidationError(
+        {f"row={row}, seat={seat}, flight={flight_id}": message}
+    )
+
+
+def is_set(bitmap, index):
+    return bool(bitmap[index >> 3] & (0x80 >> (index & 7)))
+
+
+def is_sold(seatmap, row, seat):
+    index = (row - 1) * seatmap["seats_in_row"] + (seat - 1)
+    return is_set(base64.b64decode(seatmap["occupied"]), index)
+
+
+def release_seats(seats, owner):
+    """Delete seat keys still owned by owner, keys of other holds stay.
+    Keys left behind by a Redis error expire on their own."""
+    keys = {seat_key(*seat): seat for seat in seats}
+    try:
+        values = cache.get_many(keys)
+        owned = [key for key, value in values.items() if value == owner]
+        cache.delete_many(owned)
+    except RedisError:
+        return
+    unindex_seats([keys[key] for key in owned])
+
+
+def add_claim(key, owner, timeout):
+    """Claim a seat key for an order. Without Redis every seat counts as
+    claimed, the unique (flight, row, seat) of tickets still stops
+    selling a seat twice."""
+    try:
+        return cache.add(key, owner, timeout)
+    except RedisError:
+        return True
+
+
+def hold_seats(flight, seats, user_id, minutes):
+    """Hold all seats for the user or none of them.
+    Every seat is claimed with an atomic add (SET NX) with expiry."""
+    seatmap = get_seatmap(flight)
+    for row, seat in seats:
+        if is_sold(seatmap, row, seat):
+            raise seat_error(row, seat, flight.id, "This seat is sold.")
+
+    token = uuid.uuid4().hex
+    owner = {"user": user_id, "hold": token}
+    timeout = minutes * 60
+    claimed = []
+    try:
+        for row, seat in seats:
+            if not cache.add(seat_key(flight.id, row, seat), owner, timeout):
+                release_seats(claimed, owner)
+                raise seat_error(
+                    row,
+                    seat,
+                    flight.id,
+                    "This seat is held by someone else.",
+                )
+            claimed.append((flight.id, row, seat))
+        cache.set(
+            hold_key(token),
+            {"user": user_id, "flight": flight.id, "seats": seats},
+            timeout,
+        )
+    except RedisError:
+        release_seats(claimed, owner)
+        raise SeatHoldsUnavailable()
+    index_seats(claimed, timeout)
+    return {
+        "hold": token,
+        "flight": flight.id,
+        "seats": [{"row": row, "seat": seat} for row, seat in seats],
+        "expires_at": timezone.now() + timedelta(seconds=timeout),
+    }
+
+
+def release_hold(token, user_id):
+    try:
+        hold = cache.get(hold_key(token))
+    except RedisError:
+        raise SeatHoldsUnavailable()
+    if hold is None or hold["user"] != user_id:
+        return False
+    release_seats(
+        [(hold["flight"], row, seat) for row, seat in hold["seats"]],
+        {"user": user_id, "hold": token},
+    )
+    try:
+        cache.delete(hold_key(token))
+    except RedisError:
+        pass
+    return True
+
+
+def claim_order_seats(user_id, tickets):
+    """Check seats of an order against holds before touching the database.
+    Seats held by the user are confirmed, free seats are briefly claimed
+    for the order, seats held by others are rejected.
+    Returns a callback releasing the seats of the order."""
+    seats = {
+        (ticket["flight"].id, ticket["row"], ticket["seat"]): ticket
+        for ticket in tickets
+    }
+    keys = {seat_key(*seat): seat for seat in seats}
+    claim = {"user": user_id, "hold": None}
+    claimed = []
+    try:
+        holds = cache.get_many(keys)
+        for key, seat in keys.items():
+            owner = holds.get(key)
+            if owner is None and cache.add(key, claim, ORDER_CLAIM_TIMEOUT):
+                claimed.append(seat)
+                continue
+            if owner is None:
+                owner = cache.get(key)
+            if owner is not None and owner["user"] != user_id:
+                release_seats(claimed, claim)
+                flight_id, row, number = seat
+                raise seat_error(
+                    row,
+                    number,
+                    flight_id,
+                    "This seat is held by someone else.",
+                )
+    except RedisError:
+        # holds are unknown, the unique seats of tickets decide alone
+        pass
+    index_seats(claimed, ORDER_CLAIM_TIMEOUT)
+
+    def release(sold):
+        if not sold:
+            release_seats(claimed, claim)
+            return
+        try:
+            cache.delete_many(list(keys))
+        except RedisError:
+            return
+        unindex_seats(list(seats))
+
+    return release
+
+
+def release_order_claims(user_id, tickets):
+    release_seats(
+        [
+            (ticket["flight"].id, ticket["row"], ticket["seat"])
+            for ticket in tickets
+        ],
+        {"user": user_id, "hold": None},
+    )
+
+
+def held_seats(flight):
+    """(row, seat) of held seats. Redis answers with a single
+    ZRANGEBYSCORE on the set of the flight, other caches read
+    the key of every seat."""
+    client = holds_client()
+    if client is None:
+        keys = {
+            seat_key(flight.id, row, seat): (row, seat)
+            for row in range(1, flight.airplane.rows + 1)
+            for seat in range(1, flight.airplane.seats_in_row + 1)
+        }
+        return [keys[key] for key in cache.get_many(keys)]
+    members = client.zrangebyscore(
+        backend_key(flight_holds_key(flight.id)), time.time(), "+inf"
+    )
+    return [tuple(map(int, member.split(b"-"))) for member in members]
+
+
+def held_seats_bitmap(flight):
+    """Held seats, none of them while Redis is unavailable"""
+    try:
+        held = held_seats(flight)
+    except RedisError:
+        held = []
+    return pack_seatmap(flight, held)["occupied"]
+
+
+async def aheld_seats_bitmap(flight):
+    return await sync_to_async(held_seats_bitmap)(flight)
+
+
+def get_seatmap_with_holds(flight):
+    return {**get_seatmap(flight), "held": held_seats_bitmap(flight)}
+
+
+async def aget_seatmap_with_holds(flight):
+    return {
+        **await aget_seatmap(flight),
+        "held": await aheld_seats_bitmap(flight),
+    }
+
+
+def seat_blocks(seatmap, count, adjacent):
+    """Candidate groups of free seats: runs of count seats in one row
+    when adjacent, single seats otherwise. The list starts at a random
+    place, so concurrent bookings try different seats first."""
+    rows = seatmap["rows"]
+    seats_in_row = seatmap["seats_in_row"]
+    sold = base64.b64decode(seatmap["occupied"])
+    held = base64.b64decode(seatmap["held"])
+
+    def free(row, seat):
+        index = (row - 1) * seats_in_row + (seat - 1)
+        return not is_set(sold, index) and not is_set(held, index)
+
+    size = count if adjacent else 1
+    blocks = [
+        [(row, seat + offset) for offset in range(size)]
+        for row in range(1, rows + 1)
+        for seat in range(1, seats_in_row - size + 2)
+        if all(free(row, seat + offset) for offset in range(size))
+    ]
+    if blocks:
+        start = random.randrange(len(blocks))
+        blocks = blocks[start:] + blocks[:start]
+    return blocks
+
+
+def allocate_seats(flight, count, adjacent, user_id):
+    """Pick free seats of the flight and claim them for the user's order
+    with atomic adds. A seat taken concurrently is just skipped,
+    nothing is locked or retried."""
+    seatmap = get_seatmap_with_holds(flight)
+    claim = {"user": user_id, "hold": None}
+    allocated = []
+    taken = set()
+    for block in seat_blocks(seatmap, count, adjacent):
+        if taken.intersection(block):
+            continue
+        claimed = []
+        for row, seat in block:
+            key = seat_key(flight.id, row, seat)
+            if not add_claim(key, claim, ORDER_CLAIM_TIMEOUT):
+                break
+            claimed.append((flight.id, row, seat))
+        if len(claimed) < len(block):
+            release_seats(claimed, claim)
+            continue
+        index_seats(claimed, ORDER_CLAIM_TIMEOUT)
+        allocated.extend(block)
+        taken.update(block)
+        if len(allocated) == count:
+            return allocated
+
+    release_seats([(flight.id, row, seat) for row, seat in allocated], claim)
+    raise ValidationError(
+        {
+            f"flight={flight.id}": f"There are no {count} "
+            f"{'adjacent ' if adjacent else ''}free seats on this flight."
+        }
+    )
@@ -0,0 +1,87 @@
+import hashlib
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+
+
+VARIANTS_DIR = "uploads/airplane_types/variants/"
+VARIANT_SIZES = {
+    "thumbnail": (160, 120),
+    "card": (640, 480),
+}
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def encode(image, file_format, options):
+    if file_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    # no exif, icc profile or comments in the output
+    image.info = {}
+    image.save(buffer, format=file_format, **options)
+    return buffer.getvalue()
+
+
+def store(name, extension, content):
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    path = os.path.join(VARIANTS_DIR, f"{name}-{digest}.{extension}")
+    if not default_storage.exists(path):
+        path = default_storage.save(path, ContentFile(content))
+    return path
+
+
+def generate_variants(airplane_type):
+    """Resize the image of the airplane type to every variant size in WebP
+    and JPEG. Files are named by their content hash, so they can be
+    cached forever. Returns {size: {format: path}}."""
+    with airplane_type.image.open("rb") as file:
+        original = Image.open(file)
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert(
+                "RGBA" if "transparency" in original.info else "RGB"
+            )
+
+    variants = {}
+    for size_name, size in VARIANT_SIZES.items():
+        image = original.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        variants[size_name] = {
+            extension: store(
+                f"{slugify(airplane_type.name)}-{size_name}",
+                "jpg" if extension == "jpeg" else extension,
+                encode(image, file_format, options),
+            )
+            for extension, (file_format, options) in VARIANT_FORMATS.items()
+        }
+    return variants
+
+
+def absolute_url(path, request):
+    url = default_storage.url(path)
+    return request.build_absolute_uri(url) if request else url
+
+
+def variant_url(airplane_type, size_name, extension="webp", request=None):
+    """URL of an image variant, the original image until it is generated"""
+    path = airplane_type.image_variants.get(size_name, {}).get(extension)
+    if not path and airplane_type.image:
+        path = airplane_type.image.name
+    return absolute_url(path, request) if path else None
+
+
+def variant_urls(airplane_type, request=None):
+    return {
+        size_name: {
+            extension: absolute_url(path, request)
+            for extension, path in paths.items()
+        }
+        for size_name, paths in airplane_type.image_variants.items()
+    }
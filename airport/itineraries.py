@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from redis import RedisError
+
+from airport.cache import get_version
+from airport.models import Airport, Route, Flight
+from airport_service.routers import use_primary
+
+
+MIN_CONNECTION_TIME = timedelta(minutes=45)
+MAX_CONNECTION_TIME = timedelta(hours=24)
+MAX_STOPS = 2
+MAX_ITINERARIES = 50
+INDEX_HORIZON = timedelta(days=60)
+INDEX_MAX_AGE = 10 * 60
+
+
+class ItineraryIndex:
+    """In-memory graph of routes with a time-sorted departures list
+    for every airport, covering flights departing in [start, end)."""
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.airports_by_city = defaultdict(set)
+        for airport_id, city in Airport.objects.values_list(
+            "id", "closest_city"
+        ):
+            self.airports_by_city[city].add(airport_id)
+
+        self.distances = {}
+        self.sources_of = defaultdict(set)
+        for source_id, destination_id, distance in Route.objects.values_list(
+            "source_id", "destination_id", "distance"
+        ):
+            self.distances[(source_id, destination_id)] = distance
+            self.sources_of[destination_id].add(source_id)
+
+        self.departures = defaultdict(list)
+        flights = (
+            Flight.objects.filter(
+                departure_time__gte=start,
+                departure_time__lt=end + MAX_CONNECTION_TIME * MAX_STOPS,
+            )
+            .order_by("departure_time")
+            .values_list(
+                "id",
+                "route__source_id",
+                "route__destination_id",
+                "departure_time",
+                "arrival_time",
+            )
+        )
+        for flight_id, source_id, destination_id, departure, arrival in (
+            flights.iterator(chunk_size=5000)
+        ):
+            self.departures[source_id].append(
+                (departure, arrival, flight_id, destination_id)
+            )
+        self.departure_times = {
+            airport_id: [departure[0] for departure in departures]
+            for airport_id, departures in self.departures.items()
+        }
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def reachable(self, destinations, max_legs):
+        """reachable[n] holds airports that reach destinations
+        in at most n legs by the route graph"""
+        reachable = [set(destinations)]
+        for _ in range(max_legs):
+            previous = reachable[-1]
+            current = set(previous)
+            for airport_id in previous:
+                current |= self.sources_of.get(airport_id, set())
+            reachable.append(current)
+        return reachable
+
+    def departures_between(self, airport_id, start, end):
+        times = self.departure_times.get(airport_id, ())
+        index = bisect_left(times, start)
+        for departure in self.departures.get(airport_id, ())[index:]:
+            if departure[0] >= end:
+                break
+            yield departure
+
+    def search(self, source_city, destination_city, start, end, max_stops):
+        sources = self.airports_by_city.get(source_city, set())
+        destinations = self.airports_by_city.get(destination_city, set())
+        reachable = self.reachable(destinations, max_stops + 1)
+        itineraries = []
+
+        def extend(legs, visited, airport_id, ready, window_end, legs_left):
+            for departure, arrival, flight_id, destination_id in (
+                self.departures_between(airport_id, ready, window_end)
+            ):
+                if destination_id in visited:
+                    continue
+                path = legs + [(flight_id, airport_id, destination_id)]
+                if destination_id in destinations:
+                    itineraries.append((path, arrival))
+                elif (
+                    legs_left > 1
+                    and destination_id in reachable[legs_left - 1]
+                ):
+                    extend(
+                        path,
+                        visited | {destination_id},
+                        destination_id,
+                        arrival + MIN_CONNECTION_TIME,
+                        arrival + MAX_CONNECTION_TIME,
+                        legs_left - 1,
+                    )
+
+        for source_id in sources:
+            if source_id in reachable[max_stops + 1]:
+                extend(
+                    [], {source_id}, source_id, start, end, max_stops + 1
+                )
+
+        # not truncated here, full flights are dropped by the view first
+        itineraries.sort(key=lambda item: (item[1], len(item[0])))
+        return [
+            {
+                "flights": [flight_id for flight_id, _, _ in legs],
+                "distance": sum(
+                    self.distances.get((source_id, destination_id), 0)
+                    for _, source_id, destination_id in legs
+                ),
+            }
+            for legs, _ in itineraries
+        ]
+
+
+_index = None
+_index_version = None
+_index_built_at = 0
+_index_lock = threading.Lock()
+
+
+def get_index(start, end):
+    """Shared index of upcoming flights, rebuilt when flights, routes
+    or airports change or when it gets older than INDEX_MAX_AGE.
+    Windows outside of its horizon get a one-off index."""
+    global _index, _index_version, _index_built_at
+
+    try:
+        version = get_version("itineraries")
+    except RedisError:
+        # changes are unknown, the index is rebuilt by its age only
+        version = None
+    with _index_lock:
+        if (
+            _index is None
+            or (version is not None and _index_version != version)
+            or time.monotonic() - _index_built_at > INDEX_MAX_AGE
+        ):
+            today = timezone.localtime().replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            # kept for the version, so it must not come from a lagging replica
+            with use_primary():
+                _index = ItineraryIndex(today, today + INDEX_HORIZON)
+            _index_version = version
+            _index_built_at = time.monotonic()
+        index = _index
+
+    if index.covers(start, end):
+        return index
+    return ItineraryIndex(start, end)
+
+
+def search_itineraries(source_city, destination_city, date, max_stops):
+    start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
+    end = start + timedelta(days=1)
+    index = get_index(start, end)
+    return index.search(source_city, destination_city, start, end, max_stops)
@@ -0,0 +1,423 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from airport.datasets import MIN_TURNAROUND
+from airport.models import (
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Flight,
+)
+from airport.search_index import refresh_search_index
+
+
+BENCHMARK_EMAIL = "benchmark@benchmark.com"
+BENCHMARK_PASSWORD = "benchmark"
+AIRPLANE_ROWS = 30
+AIRPLANE_SEATS_IN_ROW = 6
+FLIGHT_DURATION = timedelta(minutes=180)
+FLIGHTS_PATH = "/api/airport/flights/"
+ASYNC_FLIGHTS_PATH = "/api/airport/async/flights/"
+
+DEFAULT_MIX = (
+    {
+        "name": "flights list",
+        "method": "GET",
+        "path": "/api/airport/flights/",
+        "weight": 10,
+    },
+    {
+        "name": "flights search",
+        "method": "GET",
+        "path": "/api/airport/flights/?sources={city}&date={date}",
+        "weight": 5,
+    },
+    {
+        "name": "flight detail",
+        "method": "GET",
+        "path": "/api/airport/flights/{flight_id}/",
+        "weight": 10,
+    },
+    {
+        "name": "order create",
+        "method": "POST",
+        "path": "/api/airport/orders/",
+        "data": {
+            "tickets": [
+                {"row": "{row}", "seat": "{seat}", "flight": "{flight_id}"}
+            ]
+        },
+        "weight": 3,
+    },
+    {
+        "name": "token obtain",
+        "method": "POST",
+        "path": "/api/user/token/",
+        "data": {"email": "{email}", "password": "{password}"},
+        "auth": False,
+        "weight": 1,
+    },
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def fill(template, values):
+    if isinstance(template, str):
+        return template.format(**values)
+    if isinstance(template, dict):
+        return {key: fill(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill(value, values) for value in template]
+    return template
+
+
+def use_async_views(request):
+    if request["method"] == "GET" and request["path"].startswith(
+        FLIGHTS_PATH
+    ):
+        path = ASYNC_FLIGHTS_PATH + request["path"][len(FLIGHTS_PATH):]
+        return {**request, "path": path}
+    return request
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a weighted mix of API requests and report latency, "
+        "throughput and query counts per endpoint. Requests are read from "
+        "a JSONL file with one request per line: "
+        '{"name": ..., "method": ..., "path": ..., "data": {...}, '
+        '"auth": true, "weight": 1}. Paths and bodies may use {flight_id}, '
+        "{row}, {seat}, {city}, {date}, {email} and {password}. "
+        "Throttling applies to the replayed requests too, raise "
+        "THROTTLE_ANON_RATE and THROTTLE_USER_RATE for long runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mix", help="JSONL file with the request mix to replay"
+        )
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--flights",
+            type=int,
+            default=1000,
+            help="Number of flights to seed",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Replay against a running server instead of the test "
+            "client. Its database is seeded only with --seed",
+        )
+        parser.add_argument(
+            "--seed",
+            action="store_true",
+            help="Seed the configured database when using --base-url",
+        )
+        parser.add_argument("--random-seed", type=int, default=0)
+        parser.add_argument(
+            "--async-views",
+            action="store_true",
+            help="Send flight GET requests to the async endpoints, "
+            "to compare them with the sync ones under an ASGI server",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["random_seed"])
+        mix = self.load_mix(options["mix"])
+        if options["async_views"]:
+            mix = [use_async_views(request) for request in mix]
+
+        if options["base_url"]:
+            if options["seed"]:
+                self.seed(options["flights"])
+            self.prepare_user()
+            self.run(mix, options)
+            return
+
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options["flights"])
+            self.prepare_user()
+            self.run(mix, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def load_mix(self, path):
+        if not path:
+            return list(DEFAULT_MIX)
+        try:
+            with open(path) as file:
+                return [json.loads(line) for line in file if line.strip()]
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Cannot read request mix: {error}")
+
+    def seed(self, flights_count):
+        self.stdout.write(f"Seeding {flights_count} flights...")
+        Airport.objects.bulk_create(
+            (
+                Airport(name=f"Benchmark {i}", closest_city=f"City {i}")
+                for i in range(20)
+            ),
+            ignore_conflicts=True,
+        )
+        airports = list(Airport.objects.filter(name__startswith="Benchmark"))
+        Route.objects.bulk_create(
+            (
+                Route(source=source, destination=destination, distance=1000)
+                for source in airports
+                for destination in airports
+                if source != destination
+            ),
+            ignore_conflicts=True,
+        )
+        routes = list(Route.objects.filter(source__in=airports))
+        airplane_type, _ = AirplaneType.objects.get_or_create(
+            name="Benchmark type"
+        )
+        Airplane.objects.bulk_create(
+            (
+                Airplane(
+                    name=f"Benchmark {i}",
+                    rows=AIRPLANE_ROWS,
+                    seats_in_row=AIRPLANE_SEATS_IN_ROW,
+                    airplane_type=airplane_type,
+                )
+                for i in range(50)
+            ),
+            ignore_conflicts=True,
+        )
+        airplanes = list(airplane_type.airplanes.all())
+        Flight.objects.bulk_create(
+            self.flight_chains(flights_count, routes, airplanes),
+            batch_size=1000,
+        )
+        refresh_search_index()
+
+    def flight_chains(self, flights_count, routes, airplanes):
+        """A flight every 10 minutes, taken by the airplanes in turn. An
+        airplane departs only after its previous flight and turnaround,
+        also those of earlier seeds, so its flights never overlap."""
+        start = timezone.now() + timedelta(days=1)
+        available = {airplane.id: start for airplane in airplanes}
+        for airplane_id, arrival_time in (
+            Flight.objects.filter(airplane__in=airplanes)
+            .values("airplane")
+            .annotate(last_arrival=Max("arrival_time"))
+            .values_list("airplane", "last_arrival")
+        ):
+            available[airplane_id] = max(
+                start, arrival_time + timedelta(minutes=MIN_TURNAROUND)
+            )
+        for i in range(flights_count):
+            airplane = airplanes[i % len(airplanes)]
+            departure_time = max(
+                start + timedelta(minutes=i * 10), available[airplane.id]
+            )
+            arrival_time = departure_time + FLIGHT_DURATION
+            available[airplane.id] = arrival_time + timedelta(
+                minutes=MIN_TURNAROUND
+            )
+            yield Flight(
+                route=self.random.choice(routes),
+                airplane=airplane,
+                departure_time=departure_time,
+                arrival_time=arrival_time,
+            )
+
+    def prepare_user(self):
+        user_model = get_user_model()
+        if not user_model.objects.filter(email=BENCHMARK_EMAIL).exists():
+            user_model.objects.create_user(
+                email=BENCHMARK_EMAIL, password=BENCHMARK_PASSWORD
+            )
+        self.flights = list(
+            Flight.objects.order_by().values_list(
+                "id", "departure_time", "route__source__closest_city"
+            )
+        )
+        if not self.flights:
+            raise CommandError("There are no flights to replay against")
+
+    def placeholders(self):
+        flight_id, departure_time, city = self.random.choice(self.flights)
+        return {
+            "flight_id": flight_id,
+            "date": departure_time.date().isoformat(),
+            "city": city,
+            "row": self.random.randint(1, AIRPLANE_ROWS),
+            "seat": self.random.randint(1, AIRPLANE_SEATS_IN_ROW),
+            "email": BENCHMARK_EMAIL,
+            "password": BENCHMARK_PASSWORD,
+        }
+
+    def run(self, mix, options):
+        weights = [request.get("weight", 1) for request in mix]
+        plan = [
+            fill(request, self.placeholders())
+            for request in self.random.choices(
+                mix, weights, k=options["requests"]
+            )
+        ]
+        concurrency = max(1, options["concurrency"])
+        results = defaultdict(list)
+        lock = threading.Lock()
+
+        def worker(requests):
+            send = (
+                LiveServerSender(options["base_url"])
+                if options["base_url"]
+                else TestClientSender()
+            )
+            try:
+                for request in requests:
+                    result = send(request)
+                    with lock:
+                        results[request["name"]].append(result)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(plan[i::concurrency],))
+            for i in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.report(results, elapsed, concurrency)
+
+    def report(self, results, elapsed, concurrency):
+        total = sum(len(endpoint) for endpoint in results.values())
+        self.stdout.write(
+            f"{total} requests in {elapsed:.2f}s with concurrency "
+            f"{concurrency}: {total / elapsed:.1f} req/s"
+        )
+        self.stdout.write(
+            f"{'endpoint':<16}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'queries':>9}  statuses"
+        )
+        for name, endpoint in sorted(results.items()):
+            latencies = [latency * 1000 for latency, _, _ in endpoint]
+            queries = [count for _, _, count in endpoint if count is not None]
+            statuses = defaultdict(int)
+            for _, status_code, _ in endpoint:
+                statuses[status_code] += 1
+            self.stdout.write(
+                f"{name:<16}{len(endpoint):>7}"
+                f"{percentile(latencies, 0.5):>9.1f}"
+                f"{percentile(latencies, 0.95):>9.1f}"
+                f"{percentile(latencies, 0.99):>9.1f}"
+                + (
+                    f"{statistics.mean(queries):>9.1f}"
+                    if queries
+                    else f"{'-':>9}"
+                )
+                + "  "
+                + ", ".join(
+                    f"{code}: {count}"
+                    for code, count in sorted(statuses.items())
+                )
+            )
+
+
+class TestClientSender:
+    """Sends requests in process and counts their database queries"""
+
+    def __init__(self):
+        self.client = Client()
+        response = self.client.post(
+            "/api/user/token/",
+            {"email": BENCHMARK_EMAIL, "password": BENCHMARK_PASSWORD},
+        )
+        self.token = response.json().get("access")
+
+    def __call__(self, request):
+        headers = {}
+        if request.get("auth", True) and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        with CaptureQueriesContext(connections["default"]) as queries:
+            started = time.perf_counter()
+            response = self.client.generic(
+                request["method"],
+                request["path"],
+                json.dumps(request["data"]) if "data" in request else "",
+                content_type="application/json",
+                headers=headers,
+            )
+            latency = time.perf_counter() - started
+        return latency, response.status_code, len(queries.captured_queries)
+
+
+class LiveServerSender:
+    """Sends requests to a running server, query counts are unknown"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.token = None
+        status_code, body = self.send(
+            "POST",
+            "/api/user/token/",
+            {"email": BENCHMARK_EMAIL, "password": BENCHMARK_PASSWORD},
+        )
+        if status_code == 200:
+            self.token = json.loads(body)["access"]
+
+    def send(self, method, path, data, auth=False):
+        headers = {"Content-Type": "application/json"}
+        if auth and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            # placeholders like city names may hold spaces
+            self.base_url + urllib.parse.quote(path, safe="/?&=,:+%"),
+            data=json.dumps(data).encode() if data else None,
+            headers=headers,
+            method=method,
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        status_code, _ = self.send(
+            request["method"],
+            request["path"],
+            request.get("data"),
+            auth=request.get("auth", True),
+        )
+        return time.perf_counter() - started, status_code, None
@@ -0,0 +1,56 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections, connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the database connection overhead of a request: a fresh "
+        "connection per request against the configured pool or "
+        "persistent connections, each running one trivial query"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        params = connection.get_connection_params()
+
+        def fresh():
+            db = connection.Database.connect(**params)
+            try:
+                with db.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            finally:
+                db.close()
+
+        def configured():
+            # the same as Django does around each request
+            close_old_connections()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            close_old_connections()
+
+        settings = connection.settings_dict
+        pool = settings["OPTIONS"].get("pool")
+        if pool:
+            mode = f"pool of {pool['min_size']}..{pool['max_size']}"
+        else:
+            mode = f"CONN_MAX_AGE={settings['CONN_MAX_AGE']}"
+
+        for name, request in (("fresh connection", fresh), (mode, configured)):
+            request()
+            latencies = []
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                request()
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            self.stdout.write(
+                f"{name:<24} mean {statistics.mean(latencies):7.2f} ms  "
+                f"p50 {latencies[len(latencies) // 2]:7.2f} ms  "
+                f"p99 {latencies[int(len(latencies) * 0.99)]:7.2f} ms"
+            )
+        connection.close()
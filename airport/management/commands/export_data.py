@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+
+from airport.exports import (
+    EXPORTS,
+    EXPORT_FORMATS,
+    EXPORT_CHUNK_SIZE,
+    export_lines,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream flights, orders or tickets as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=EXPORTS)
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=EXPORT_FORMATS,
+            default="csv",
+        )
+        parser.add_argument(
+            "--file", help="Write to this file instead of stdout"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        lines = export_lines(
+            options["name"], options["file_format"], options["chunk_size"]
+        )
+        if options["file"]:
+            with open(options["file"], "w", newline="") as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,97 @@
+import re
+from datetime import datetime, time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from airport.datasets import DatasetGenerator
+from airport.models import Airplane
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset for performance testing: airports, "
+        "routes, airplanes, crew, users, flights over a date range and "
+        "orders with tickets at a target load factor. The same seed and "
+        "start give the same data"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--start",
+            type=datetime.fromisoformat,
+            help="First departure date, today by default",
+        )
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--airports", type=int, default=50)
+        parser.add_argument("--routes-per-airport", type=int, default=8)
+        parser.add_argument("--airplanes", type=int, default=100)
+        parser.add_argument("--flights", type=int, default=10000)
+        parser.add_argument("--crew-per-flight", type=int, default=4)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--load-factor",
+            type=float,
+            default=0.8,
+            help="Average share of sold seats",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Flights generated and copied at once",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="Synthetic",
+            help="Prefix of generated names, to tell datasets apart",
+        )
+
+    def handle(self, *args, **options):
+        if options["airports"] < 2 or options["airplanes"] < 1:
+            raise CommandError("At least 2 airports and 1 airplane needed")
+        if not 0 <= options["load_factor"] <= 1:
+            raise CommandError("Load factor must be between 0 and 1")
+        prefix = options["prefix"]
+        # names keep the case of the prefix, emails are lower case
+        emails = rf"^{re.escape(prefix.lower())}[0-9]+@example\.com$"
+        if (
+            Airplane.objects.filter(name__startswith=f"{prefix} ").exists()
+            or get_user_model().objects.filter(email__regex=emails).exists()
+        ):
+            raise CommandError(
+                f"A dataset with prefix '{prefix}' already "
+                "exists, please pass another --prefix"
+            )
+
+        start = options["start"] or datetime.combine(
+            timezone.localdate(), time()
+        )
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        generator = DatasetGenerator(
+            start=start,
+            seed=options["seed"],
+            airports=options["airports"],
+            routes_per_airport=options["routes_per_airport"],
+            airplanes=options["airplanes"],
+            flights=options["flights"],
+            days=options["days"],
+            crew_per_flight=options["crew_per_flight"],
+            users=options["users"],
+            load_factor=options["load_factor"],
+            batch_size=options["batch_size"],
+            prefix=options["prefix"],
+        )
+        with transaction.atomic():
+            counts = generator.generate()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {counts['flights']} flights, "
+                f"{counts['orders']} orders and "
+                f"{counts['tickets']} tickets"
+            )
+        )
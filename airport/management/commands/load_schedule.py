@@ -0,0 +1,69 @@
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+
+from airport.schedules import (
+    READERS,
+    SCHEDULE_BATCH_SIZE,
+    SCHEDULE_FORMATS,
+    ScheduleLoader,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load flights from a CSV, JSON or NDJSON schedule file in batches. "
+        "Airports are given by name and city, airplanes and crew by name. "
+        "Invalid rows are reported and skipped, the rest is loaded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=SCHEDULE_FORMATS,
+            help="Taken from the file extension by default",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=SCHEDULE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file without loading it",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or (
+            os.path.splitext(path)[1].lstrip(".").lower()
+        )
+        if file_format not in SCHEDULE_FORMATS:
+            raise CommandError(
+                f"Unknown schedule format '{file_format}', "
+                "please pass --format"
+            )
+
+        def report(line, message):
+            self.stderr.write(f"row {line}: {message}")
+
+        loader = ScheduleLoader(
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            on_error=report,
+        )
+        try:
+            with open(path, newline="", encoding="utf-8") as file:
+                loaded, failed = loader.load(READERS[file_format](file))
+        except OSError as error:
+            raise CommandError(error)
+        except ValidationError as error:
+            raise CommandError(
+                f"{error.message}, {loader.loaded} flights loaded"
+            )
+
+        self.stdout.write(
+            f"{'Validated' if options['dry_run'] else 'Loaded'} "
+            f"{loaded} flights, {failed} rows failed"
+        )
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from airport.models import FlightSearchIndex
+from airport.search_index import refresh_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized flight search index from scratch"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FlightSearchIndex.objects.all().delete()
+            refresh_search_index()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {FlightSearchIndex.objects.count()} flights"
+            )
+        )
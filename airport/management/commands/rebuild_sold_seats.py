@@ -0,0 +1,58 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from airport.models import Flight, Ticket
+from airport.search_index import refresh_search_index
+
+
+class Command(BaseCommand):
+    help = "Verify and rebuild the denormalized Flight.sold_seats counter"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report mismatched flights, do not fix them",
+        )
+
+    def handle(self, *args, **options):
+        mismatched = (
+            Flight.objects.annotate(actual_sold_seats=Count("tickets"))
+            .exclude(sold_seats=F("actual_sold_seats"))
+            .values_list("id", "sold_seats", "actual_sold_seats")
+            .order_by("id")
+        )
+        mismatched = list(mismatched)
+        for flight_id, stored, actual in mismatched:
+            self.stdout.write(
+                f"Flight {flight_id}: stored {stored}, actual {actual}"
+            )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("All counters are correct"))
+            return
+        if options["check"]:
+            raise CommandError(
+                f"{len(mismatched)} flights have mismatched sold seats"
+            )
+
+        tickets_count = (
+            Ticket.objects.filter(flight=OuterRef("pk"))
+            .order_by()
+            .values("flight")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        with transaction.atomic():
+            flights = Flight.objects.filter(
+                id__in=[flight_id for flight_id, _, _ in mismatched]
+            )
+            updated = flights.update(
+                sold_seats=Coalesce(Subquery(tickets_count), Value(0))
+            )
+            refresh_search_index(flights)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt counters of {updated} flights")
+        )
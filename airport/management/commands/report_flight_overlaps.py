@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand, CommandError
+
+from airport.models import Airplane
+from airport.rosters import airplane_overlaps, describe_conflict
+
+
+class Command(BaseCommand):
+    help = (
+        "List flights scheduled on the same airplane at overlapping times, "
+        "in one pass over the flights. Run it before migrating to the "
+        "airplane overlap constraint, which fails while any are left"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error when overlaps are found",
+        )
+
+    def handle(self, *args, **options):
+        airplanes = dict(Airplane.objects.values_list("id", "name"))
+        count = 0
+        for airplane_id, first, second in airplane_overlaps():
+            self.stdout.write(
+                describe_conflict(airplanes[airplane_id], first, second)
+            )
+            count += 1
+        if count and options["fail"]:
+            raise CommandError(f"Found {count} overlapping flight pairs")
+        self.stdout.write(f"Found {count} overlapping flight pairs")
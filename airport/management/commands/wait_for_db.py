@@ -1,11 +1,31 @@
+import math
 import os
+import random
 import time
 
-import psycopg2
 from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+
+CONNECT_TIMEOUT = 5
 
 
 class Command(BaseCommand):
+    help = (
+        "Wait until the database accepts connections, retrying with "
+        "exponential backoff and jitter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60,
+            help="Give up after this many seconds",
+        )
+        parser.add_argument("--initial-delay", type=float, default=0.5)
+        parser.add_argument("--max-delay", type=float, default=8)
+
     def handle(self, *args, **options):
         try:
             os.environ["POSTGRES_PASSWORD"]
@@ -15,24 +35,40 @@ class Command(BaseCommand):
                 "'POSTGRES_PASSWORD' before running the container"
             )
 
-        user = os.environ.get("POSTGRES_USER", "postgres")
-        for i in range(1, 21):
-            self.stdout.write(f"Connecting to DB, try #{i} out of 20:")
+        connection = connections["default"]
+        deadline = time.monotonic() + options["timeout"]
+        delay = options["initial_delay"]
+        attempt = 1
+        while True:
+            self.stdout.write(f"Connecting to DB, try #{attempt}:")
             try:
-                conn = psycopg2.connect(
-                    f"user={user} "
-                    f"password={os.environ['POSTGRES_PASSWORD']} "
-                    f"dbname={os.environ.get('POSTGRES_DB', user)} "
-                    f"host={os.environ.get('POSTGRES_HOST', 'db')} "
-                    f"port={os.environ.get('POSTGRES_PORT', '5432')}"
-                )
-                conn.close()
+                self.probe(connection, deadline - time.monotonic())
                 self.stdout.write("Connected to DB successfully")
                 return
-            except psycopg2.OperationalError:
+            except connection.Database.OperationalError as error:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Connection to DB failed for {attempt} tries: "
+                        f"{error}"
+                    )
+                # full jitter keeps restarting containers out of step
+                sleep = min(random.uniform(0, delay), remaining)
                 self.stdout.write(
-                    "Connection to DB failed, trying again in 2 seconds..."
+                    "Connection to DB failed, "
+                    f"trying again in {sleep:.1f} seconds..."
                 )
-                time.sleep(2)
+                time.sleep(sleep)
+                delay = min(delay * 2, options["max_delay"])
+                attempt += 1
 
-        self.stderr.write("Connection to DB failed for 20 tries.")
+    @staticmethod
+    def probe(connection, remaining):
+        """Connect directly instead of through the connection pool,
+        which would block each try for the whole pool timeout"""
+        params = connection.get_connection_params()
+        params["connect_timeout"] = max(
+            1, min(CONNECT_TIMEOUT, math.ceil(remaining))
+        )
+        with connection.Database.connect(**params) as db:
+            db.execute("SELECT 1")
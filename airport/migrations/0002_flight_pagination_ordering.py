@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="flight",
+            options={"ordering": ("departure_time", "id")},
+        ),
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["departure_time", "id"], name="airport_fli_departu_5be25a_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 00:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_sold_seats(apps, schema_editor):
+    Flight = apps.get_model("airport", "Flight")
+    Ticket = apps.get_model("airport", "Ticket")
+    tickets_count = (
+        Ticket.objects.filter(flight=OuterRef("pk"))
+        .order_by()
+        .values("flight")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Flight.objects.update(
+        sold_seats=Coalesce(Subquery(tickets_count), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0002_flight_pagination_ordering"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="sold_seats",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_sold_seats, migrations.RunPython.noop),
+    ]
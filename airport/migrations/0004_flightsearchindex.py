@@ -0,0 +1,96 @@
+# Generated by Django 6.0 on 2026-10-17 00:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+
+def fill_search_index(apps, schema_editor):
+    Flight = apps.get_model("airport", "Flight")
+    FlightSearchIndex = apps.get_model("airport", "FlightSearchIndex")
+    flights = Flight.objects.order_by().values_list(
+        "id",
+        "route__source__closest_city",
+        "route__destination__closest_city",
+        TruncDate("departure_time"),
+        "departure_time",
+        "airplane__airplane_type__name",
+        F("airplane__rows") * F("airplane__seats_in_row") - F("sold_seats"),
+    )
+    FlightSearchIndex.objects.bulk_create(
+        (
+            FlightSearchIndex(
+                flight_id=flight_id,
+                source_city=source_city,
+                destination_city=destination_city,
+                departure_date=departure_date,
+                departure_time=departure_time,
+                airplane_type=airplane_type,
+                available_seats=available_seats,
+            )
+            for (
+                flight_id,
+                source_city,
+                destination_city,
+                departure_date,
+                departure_time,
+                airplane_type,
+                available_seats,
+            ) in flights.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0003_flight_sold_seats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlightSearchIndex",
+            fields=[
+                (
+                    "flight",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="airport.flight",
+                    ),
+                ),
+                ("source_city", models.CharField(max_length=100)),
+                ("destination_city", models.CharField(max_length=100)),
+                ("departure_date", models.DateField()),
+                ("departure_time", models.DateTimeField()),
+                ("airplane_type", models.CharField(max_length=100)),
+                ("available_seats", models.IntegerField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "source_city",
+                            "destination_city",
+                            "departure_date",
+                            "departure_time",
+                        ],
+                        name="airport_fli_source__62ac1c_idx",
+                    ),
+                    models.Index(
+                        fields=["destination_city", "departure_date"],
+                        name="airport_fli_destina_8c9bb0_idx",
+                    ),
+                    models.Index(
+                        fields=["departure_date", "departure_time"],
+                        name="airport_fli_departu_926748_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
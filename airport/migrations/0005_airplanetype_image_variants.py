@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0004_flightsearchindex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airplanetype",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
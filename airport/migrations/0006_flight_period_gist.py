@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 00:49
+
+import airport.models
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0005_airplanetype_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=django.contrib.postgres.indexes.GistIndex(
+                airport.models.TsTzRange(
+                    models.F("departure_time"), models.F("arrival_time")
+                ),
+                name="airport_flight_period_gist",
+            ),
+        ),
+    ]
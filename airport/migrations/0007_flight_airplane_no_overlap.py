@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-17 00:54
+
+import airport.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0006_flight_period_gist"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="flight",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=(
+                    (
+                        airport.models.Int8Range(
+                            "airplane",
+                            "airplane",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(
+                                inclusive_upper=True
+                            ),
+                        ),
+                        "&&",
+                    ),
+                    (
+                        airport.models.TsTzRange(
+                            models.F("departure_time"), models.F("arrival_time")
+                        ),
+                        "&&",
+                    ),
+                ),
+                name="airport_flight_airplane_no_overlap",
+                violation_error_message="The airplane is already scheduled for an overlapping flight.",
+            ),
+        ),
+    ]
@@ -3,6 +3,14 @@ import uuid
 from datetime import datetime
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import (
+    BigIntegerRangeField,
+    DateTimeRangeField,
+    RangeBoundary,
+    RangeOperators,
+)
+from django.contrib.postgres.indexes import GistIndex
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.text import slugify
@@ -80,6 +88,8 @@ class AirplaneType(models.Model):
     image = models.ImageField(
         upload_to=create_airplane_type_image_path, null=True, blank=True
     )
+    # resized copies of the image by size and format, see airport.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ("name",)
@@ -107,6 +117,27 @@ class Airplane(models.Model):
         return self.name
 
 
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+class Int8Range(models.Func):
+    function = "INT8RANGE"
+    output_field = BigIntegerRangeField()
+
+
+AIRPLANE_OVERLAP_CONSTRAINT = "airport_flight_airplane_no_overlap"
+
+
+def flight_period(prefix=""):
+    """[departure, arrival) of flights as a range, the expression of their
+    GiST index. prefix is the path to the flight, like "flight__"."""
+    return TsTzRange(
+        models.F(f"{prefix}departure_time"), models.F(f"{prefix}arrival_time")
+    )
+
+
 class Flight(models.Model):
     route = models.ForeignKey(
         Route, on_delete=models.CASCADE, related_name="flights"
@@ -116,14 +147,41 @@ class Flight(models.Model):
     )
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
+    sold_seats = models.PositiveIntegerField(default=0, editable=False)
     crew = models.ManyToManyField(Crew, related_name="flights", blank=True)
 
     class Meta:
-        ordering = ("departure_time",)
+        ordering = ("departure_time", "id")
+        indexes = (
+            models.Index(fields=("departure_time", "id")),
+            GistIndex(flight_period(), name="airport_flight_period_gist"),
+        )
+        constraints = (
+            # [airplane, airplane] ranges overlap only for the same
+            # airplane, which needs no btree_gist extension
+            ExclusionConstraint(
+                name=AIRPLANE_OVERLAP_CONSTRAINT,
+                expressions=(
+                    (
+                        Int8Range(
+                            "airplane",
+                            "airplane",
+                            RangeBoundary(inclusive_upper=True),
+                        ),
+                        RangeOperators.OVERLAPS,
+                    ),
+                    (flight_period(), RangeOperators.OVERLAPS),
+                ),
+                violation_error_message=(
+                    "The airplane is already scheduled for an overlapping "
+                    "flight."
+                ),
+            ),
+        )
 
     @staticmethod
     def validate_datetime(departure_time, arrival_time, error_to_raise):
-        if departure_time > arrival_time:
+        if departure_time >= arrival_time:
             raise error_to_raise(
                 "Departure time must be earlier than Arrival time."
             )
@@ -147,6 +205,44 @@ class Flight(models.Model):
         )
 
 
+class FlightSearchIndex(models.Model):
+    """Denormalized copy of the flight search fields,
+    kept in sync by airport.signals"""
+
+    flight = models.OneToOneField(
+        Flight,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_index",
+    )
+    source_city = models.CharField(max_length=100)
+    destination_city = models.CharField(max_length=100)
+    departure_date = models.DateField()
+    departure_time = models.DateTimeField()
+    airplane_type = models.CharField(max_length=100)
+    available_seats = models.IntegerField()
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=(
+                    "source_city",
+                    "destination_city",
+                    "departure_date",
+                    "departure_time",
+                )
+            ),
+            models.Index(fields=("destination_city", "departure_date")),
+            models.Index(fields=("departure_date", "departure_time")),
+        )
+
+    def __str__(self):
+        return (
+            f"{self.source_city} -> {self.destination_city} "
+            f"({self.departure_date})"
+        )
+
+
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(
@@ -0,0 +1,35 @@
+from rest_framework.pagination import CursorPagination
+
+
+class BaseCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class CrewPagination(BaseCursorPagination):
+    ordering = ("first_name", "last_name", "id")
+
+
+class AirportPagination(BaseCursorPagination):
+    ordering = ("name", "closest_city", "id")
+
+
+class RoutePagination(BaseCursorPagination):
+    ordering = ("id",)
+
+
+class AirplaneTypePagination(BaseCursorPagination):
+    ordering = ("name", "id")
+
+
+class AirplanePagination(BaseCursorPagination):
+    ordering = ("name", "id")
+
+
+class FlightPagination(BaseCursorPagination):
+    ordering = ("departure_time", "id")
+
+
+class OrderPagination(BaseCursorPagination):
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,177 @@
+import heapq
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from airport.models import Flight, flight_period
+
+
+ROSTER_DAYS = 7
+SCHEDULE_MAX_DAYS = 31
+ROSTER_MAX_ASSIGNMENTS = 10000
+
+# a flight of a crew member, proposed or already assigned
+Duty = namedtuple(
+    "Duty", ("flight_id", "departure_time", "arrival_time", "proposed")
+)
+
+
+def with_flight_count(queryset):
+    """Number of flights of each crew member, counted per returned row
+    on the crew index of the crew-flight table, not for all crew"""
+    flights = (
+        Flight.crew.through.objects.filter(crew=OuterRef("pk"))
+        .order_by()
+        .values("crew")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return queryset.annotate(flight_count=Coalesce(Subquery(flights), 0))
+
+
+def crew_flights(start, end):
+    """Flights departing in the window. The window keeps the departure
+    time index scan short however long the crew history is."""
+    return Flight.objects.filter(
+        departure_time__gte=start, departure_time__lt=end
+    ).select_related("route__source", "route__destination", "airplane")
+
+
+def roster_flights():
+    now = timezone.now()
+    return crew_flights(now, now + timedelta(days=ROSTER_DAYS))
+
+
+def overlapping_duties(duties):
+    """Pairs of overlapping duties of one crew member, at least one of
+    them proposed. One sweep by departure time, keeping the duties still
+    in the air in a heap by arrival time."""
+    duties = sorted(
+        duties, key=lambda duty: (duty.departure_time, duty.arrival_time)
+    )
+    in_air = []
+    conflicts = []
+    for index, duty in enumerate(duties):
+        while in_air and in_air[0][0] <= duty.departure_time:
+            heapq.heappop(in_air)
+        for _, other in in_air:
+            if duty.proposed or duties[other].proposed:
+                conflicts.append((duties[other], duty))
+        if duty.arrival_time > duty.departure_time:
+            heapq.heappush(in_air, (duty.arrival_time, index))
+    return conflicts
+
+
+def find_overlaps(assignments, assigned_flights):
+    """Overlapping flights for proposed (key, Duty) assignments, as
+    (key, Duty, Duty). assigned_flights(keys, period) gives the flights
+    the keys already have in the period, as (key, flight_id, departure
+    time, arrival time), from one query over the GiST index of flight
+    periods. So a whole roster is checked with one query and one sweep
+    per key. A proposed duty replaces the assigned one for the same
+    flight."""
+    duties = defaultdict(dict)
+    for number, (key, duty) in enumerate(assignments):
+        flight = duty.flight_id if duty.flight_id is not None else -number - 1
+        duties[key][flight] = duty
+    if not duties:
+        return []
+
+    start = min(
+        duty.departure_time
+        for key_duties in duties.values()
+        for duty in key_duties.values()
+    )
+    end = max(
+        duty.arrival_time
+        for key_duties in duties.values()
+        for duty in key_duties.values()
+    )
+    for key, flight_id, departure_time, arrival_time in assigned_flights(
+        duties.keys(), DateTimeTZRange(start, max(start, end))
+    ):
+        duties[key].setdefault(
+            flight_id, Duty(flight_id, departure_time, arrival_time, False)
+        )
+
+    return [
+        (key, first, second)
+        for key, key_duties in duties.items()
+        for first, second in overlapping_duties(key_duties.values())
+    ]
+
+
+def assigned_crew_flights(crew_ids, period):
+    return (
+        Flight.crew.through.objects.filter(crew_id__in=crew_ids)
+        .annotate(period=flight_period("flight__"))
+        .filter(period__overlap=period)
+        .values_list(
+            "crew_id",
+            "flight_id",
+            "flight__departure_time",
+            "flight__arrival_time",
+        )
+    )
+
+
+def scheduled_airplane_flights(airplane_ids, period):
+    return (
+        Flight.objects.filter(airplane_id__in=airplane_ids)
+        .annotate(period=flight_period())
+        .filter(period__overlap=period)
+        .values_list("airplane_id", "id", "departure_time", "arrival_time")
+    )
+
+
+def find_crew_conflicts(assignments):
+    """Flights putting crew in two places at once, for (crew_id, Duty)"""
+    return find_overlaps(assignments, assigned_crew_flights)
+
+
+def find_airplane_overlaps(assignments):
+    """Double bookings of airplanes, for (airplane_id, Duty)"""
+    return find_overlaps(assignments, scheduled_airplane_flights)
+
+
+def airplane_overlaps():
+    """Overlapping flights of the same airplane already in the database,
+    found in one pass over the flights ordered by airplane and departure
+    time"""
+    flights = (
+        Flight.objects.order_by("airplane_id", "departure_time", "id")
+        .values_list("airplane_id", "id", "departure_time", "arrival_time")
+        .iterator(chunk_size=10000)
+    )
+    for airplane_id, airplane_flights in groupby(
+        flights, key=itemgetter(0)
+    ):
+        for first, second in overlapping_duties(
+            Duty(flight_id, departure_time, arrival_time, True)
+            for _, flight_id, departure_time, arrival_time in airplane_flights
+        ):
+            yield airplane_id, first, second
+
+
+def describe_conflict(crew, first, second):
+    def describe(duty):
+        name = (
+            "this flight"
+            if duty.flight_id is None
+            else f"flight {duty.flight_id}"
+        )
+        return (
+            f"{name} ({duty.departure_time:%Y-%m-%d %H:%M} - "
+            f"{duty.arrival_time:%Y-%m-%d %H:%M})"
+        )
+
+    return (
+        f"{crew} would be on {describe(first)} and on {describe(second)} "
+        "at the same time."
+    )
@@ -0,0 +1,354 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from airport.cache import bump_versions
+from airport.models import Airport, Route, Airplane, Crew, Flight
+from airport.rosters import (
+    Duty,
+    describe_conflict,
+    find_airplane_overlaps,
+    find_crew_conflicts,
+)
+from airport.search_index import refresh_search_index
+
+SCHEDULE_FORMATS = ("csv", "json", "ndjson")
+SCHEDULE_BATCH_SIZE = 1000
+REQUIRED_FIELDS = (
+    "source",
+    "source_city",
+    "destination",
+    "destination_city",
+    "airplane",
+    "departure_time",
+    "arrival_time",
+)
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for line, row in enumerate(csv.DictReader(file), start=2):
+        yield line, row
+
+
+def read_ndjson(file):
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as error:
+            yield line, ValidationError(f"Invalid JSON: {error}")
+
+
+def read_json(file):
+    """Items of a top level JSON array, decoded one at a time and
+    numbered from 1. CSV and NDJSON rows are numbered by their line."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    number = 0
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValidationError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise ValidationError("Truncated JSON array")
+                # the item continues in the next chunk
+                break
+            number += 1
+            position = end
+            yield number, item
+        if not chunk:
+            raise ValidationError("Truncated JSON array")
+
+
+READERS = {"csv": read_csv, "json": read_json, "ndjson": read_ndjson}
+
+
+def duty(line, row):
+    """The flight of a row, proposed by its row number"""
+    return Duty(None, row["departure_time"], row["arrival_time"], line)
+
+
+def parse_time(value, field):
+    try:
+        parsed = parse_datetime(str(value).strip())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError(f"{field}: invalid datetime '{value}'")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_row(row):
+    """Check a schedule row with the model rules, without the database"""
+    if not isinstance(row, dict):
+        raise ValidationError("Row must be an object")
+    missing = [
+        field for field in REQUIRED_FIELDS if not str(row.get(field) or "")
+    ]
+    if missing:
+        raise ValidationError(f"Missing fields: {', '.join(missing)}")
+
+    source = (row["source"].strip(), row["source_city"].strip())
+    destination = (
+        row["destination"].strip(),
+        row["destination_city"].strip(),
+    )
+    Route.validate_airports(source, destination, ValidationError)
+    departure_time = parse_time(row["departure_time"], "departure_time")
+    arrival_time = parse_time(row["arrival_time"], "arrival_time")
+    Flight.validate_datetime(departure_time, arrival_time, ValidationError)
+
+    distance = row.get("distance")
+    if distance in (None, ""):
+        distance = None
+    else:
+        try:
+            distance = int(distance)
+        except (TypeError, ValueError):
+            distance = -1
+        if distance <= 0:
+            raise ValidationError(
+                f"distance: invalid value '{row['distance']}'"
+            )
+
+    crew = row.get("crew") or []
+    if isinstance(crew, str):
+        crew = crew.split(";")
+    return {
+        "source": source,
+        "destination": destination,
+        "distance": distance,
+        "airplane": str(row["airplane"]).strip(),
+        "departure_time": departure_time,
+        "arrival_time": arrival_time,
+        "crew": [name.strip() for name in crew if name.strip()],
+    }
+
+
+class ScheduleLoader:
+    """Loads flights in batches with bulk inserts. Airports, airplanes and
+    crew are looked up by natural keys, routes are created when the row
+    gives their distance. Bad rows are reported and skipped."""
+
+    def __init__(
+        self, batch_size=SCHEDULE_BATCH_SIZE, dry_run=False, on_error=None
+    ):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.on_error = on_error
+        self.loaded = 0
+        self.failed = 0
+        self.airports = {
+            (name, city): airport_id
+            for airport_id, name, city in Airport.objects.values_list(
+                "id", "name", "closest_city"
+            )
+        }
+        self.airplanes = dict(Airplane.objects.values_list("name", "id"))
+        self.airplane_names = {
+            airplane_id: name for name, airplane_id in self.airplanes.items()
+        }
+        self.crew = defaultdict(list)
+        self.crew_names = {}
+        for crew_id, first_name, last_name in Crew.objects.values_list(
+            "id", "first_name", "last_name"
+        ):
+            self.crew[f"{first_name} {last_name}"].append(crew_id)
+            self.crew_names[crew_id] = f"{first_name} {last_name}"
+        self.routes = {
+            (source_id, destination_id): route_id
+            for route_id, source_id, destination_id in (
+                Route.objects.values_list("id", "source_id", "destination_id")
+            )
+        }
+        # the first distance given for each route missing from the database
+        self.route_distances = {}
+
+    def error(self, line, error):
+        self.failed += 1
+        if self.on_error:
+            messages = (
+                error.messages
+                if isinstance(error, ValidationError)
+                else [str(error)]
+            )
+            self.on_error(line, "; ".join(messages))
+
+    def load(self, rows):
+        rows = iter(rows)
+        created_routes = False
+        while batch := list(islice(rows, self.batch_size)):
+            created_routes |= self.load_batch(batch)
+        if self.loaded and not self.dry_run:
+            names = ("flights", "flight-schedule", "itineraries")
+            bump_versions(*names + (("routes",) if created_routes else ()))
+        return self.loaded, self.failed
+
+    def resolve(self, row):
+        airport_ids = []
+        for name, city in (row["source"], row["destination"]):
+            if (name, city) not in self.airports:
+                raise ValidationError(f"Unknown airport '{name}' ({city})")
+            airport_ids.append(self.airports[name, city])
+        row["route_key"] = tuple(airport_ids)
+        if row["distance"] is not None:
+            self.route_distances.setdefault(row["route_key"], row["distance"])
+        if (
+            row["route_key"] not in self.routes
+            and row["route_key"] not in self.route_distances
+        ):
+            raise ValidationError(
+                "Unknown route, give its distance to create it"
+            )
+
+        if row["airplane"] not in self.airplanes:
+            raise ValidationError(f"Unknown airplane '{row['airplane']}'")
+        row["airplane_id"] = self.airplanes[row["airplane"]]
+
+        row["crew_ids"] = []
+        for name in row["crew"]:
+            crew_ids = self.crew.get(name, [])
+            if len(crew_ids) != 1:
+                raise ValidationError(
+                    f"{'Ambiguous' if crew_ids else 'Unknown'} crew '{name}'"
+                )
+            row["crew_ids"].append(crew_ids[0])
+        return row
+
+    def load_batch(self, batch):
+        rows = []
+        for line, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                rows.append((line, self.resolve(parse_row(row))))
+            except ValidationError as error:
+                self.error(line, error)
+
+        rows = self.without_overlaps(
+            rows,
+            find_airplane_overlaps(
+                (row["airplane_id"], duty(line, row)) for line, row in rows
+            ),
+            self.airplane_names,
+        )
+        valid = self.without_overlaps(
+            rows,
+            find_crew_conflicts(
+                (crew_id, duty(line, row))
+                for line, row in rows
+                for crew_id in row["crew_ids"]
+            ),
+            self.crew_names,
+        )
+
+        if self.dry_run:
+            self.loaded += len(valid)
+            return False
+        try:
+            with transaction.atomic():
+                new_routes = self.create_routes(row for _, row in valid)
+                self.create_flights(
+                    [row for _, row in valid], {**self.routes, **new_routes}
+                )
+        except DatabaseError as error:
+            for line, _ in valid:
+                self.error(line, error)
+            return False
+        # only committed routes, a rolled back batch creates them again
+        self.routes.update(new_routes)
+        self.loaded += len(valid)
+        return bool(new_routes)
+
+    def without_overlaps(self, rows, overlaps, names):
+        """Fails rows putting an airplane or crew on two flights at once,
+        found for the whole batch in one pass. Of two overlapping rows
+        the later one fails, of a row and a loaded flight the row."""
+        failed = {}
+        # in file order, so a row that already failed frees its time
+        for key, first, second in sorted(
+            overlaps,
+            key=lambda overlap: max(overlap[1].proposed, overlap[2].proposed),
+        ):
+            earlier, line = sorted((first.proposed, second.proposed))
+            if earlier not in failed and line not in failed:
+                failed[line] = describe_conflict(names[key], first, second)
+        for line, message in failed.items():
+            self.error(line, ValidationError(message))
+        return [(line, row) for line, row in rows if line not in failed]
+
+    def create_routes(self, rows):
+        new_routes = {
+            row["route_key"]: self.route_distances[row["route_key"]]
+            for row in rows
+            if row["route_key"] not in self.routes
+        }
+        if not new_routes:
+            return {}
+        Route.objects.bulk_create(
+            (
+                Route(
+                    source_id=source_id,
+                    destination_id=destination_id,
+                    distance=distance,
+                )
+                for (source_id, destination_id), distance in new_routes.items()
+            ),
+            ignore_conflicts=True,
+        )
+        return {
+            (source_id, destination_id): route_id
+            for route_id, source_id, destination_id in Route.objects.filter(
+                source_id__in={source_id for source_id, _ in new_routes},
+                destination_id__in={
+                    destination_id for _, destination_id in new_routes
+                },
+            ).values_list("id", "source_id", "destination_id")
+        }
+
+    def create_flights(self, rows, routes):
+        flights = Flight.objects.bulk_create(
+            Flight(
+                route_id=routes[row["route_key"]],
+                airplane_id=row["airplane_id"],
+                departure_time=row["departure_time"],
+                arrival_time=row["arrival_time"],
+            )
+            for row in rows
+        )
+        Flight.crew.through.objects.bulk_create(
+            Flight.crew.through(flight_id=flight.id, crew_id=crew_id)
+            for flight, row in zip(flights, rows)
+            for crew_id in row["crew_ids"]
+        )
+        refresh_search_index(
+            Flight.objects.filter(id__in=[flight.id for flight in flights])
+        )
@@ -0,0 +1,64 @@
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+from airport.models import Flight, FlightSearchIndex
+
+
+SEARCH_INDEX_BATCH_SIZE = 1000
+SEARCH_INDEX_FIELDS = (
+    "source_city",
+    "destination_city",
+    "departure_date",
+    "departure_time",
+    "airplane_type",
+    "available_seats",
+)
+
+
+def refresh_search_index(flights=None):
+    """Insert or update search index rows of the given flights"""
+    if flights is None:
+        flights = Flight.objects.all()
+    rows = (
+        flights.order_by()
+        .annotate(
+            source_city=F("route__source__closest_city"),
+            destination_city=F("route__destination__closest_city"),
+            departure_date=TruncDate("departure_time"),
+            airplane_type_name=F("airplane__airplane_type__name"),
+            available_seats=(
+                F("airplane__rows") * F("airplane__seats_in_row")
+                - F("sold_seats")
+            ),
+        )
+        .values_list(
+            "id",
+            "source_city",
+            "destination_city",
+            "departure_date",
+            "departure_time",
+            "airplane_type_name",
+            "available_seats",
+        )
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=SEARCH_INDEX_BATCH_SIZE):
+        batch.append(
+            FlightSearchIndex(
+                flight_id=row[0], **dict(zip(SEARCH_INDEX_FIELDS, row[1:]))
+            )
+        )
+        if len(batch) == SEARCH_INDEX_BATCH_SIZE:
+            save_batch(batch)
+            batch = []
+    if batch:
+        save_batch(batch)
+
+
+def save_batch(batch):
+    FlightSearchIndex.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=("flight",),
+        update_fields=SEARCH_INDEX_FIELDS,
+    )
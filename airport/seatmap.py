@@ -0,0 +1,105 @@
+import base64
+
+from django.core.cache import cache
+from django.db import transaction
+from redis import RedisError
+
+from airport.models import Ticket
+from airport_service.routers import use_primary
+
+
+SEATMAP_CACHE_TIMEOUT = 60 * 60
+
+
+def seatmap_cache_key(flight_id):
+    return f"flight-seatmap-{flight_id}"
+
+
+def pack_seatmap(flight, sold):
+    """Pack sold seats of the flight into a base64 bitmap.
+
+    Seats are numbered row by row: bit number
+    (row - 1) * seats_in_row + (seat - 1) is set when the seat is sold,
+    the most significant bit of each byte goes first.
+    """
+    rows = flight.airplane.rows
+    seats_in_row = flight.airplane.seats_in_row
+    bitmap = bytearray((rows * seats_in_row + 7) // 8)
+    for row, seat in sold:
+        if row > rows or seat > seats_in_row:
+            continue
+        index = (row - 1) * seats_in_row + (seat - 1)
+        bitmap[index >> 3] |= 0x80 >> (index & 7)
+    return {
+        "rows": rows,
+        "seats_in_row": seats_in_row,
+        "occupied": base64.b64encode(bitmap).decode(),
+    }
+
+
+def sold_seats(flight):
+    return (
+        Ticket.objects.filter(flight_id=flight.id)
+        .values_list("row", "seat")
+        .order_by()
+    )
+
+
+def build_seatmap(flight):
+    return pack_seatmap(flight, sold_seats(flight).iterator())
+
+
+async def abuild_seatmap(flight):
+    return pack_seatmap(
+        flight, [seat async for seat in sold_seats(flight).aiterator()]
+    )
+
+
+def is_stale(seatmap, flight):
+    return (
+        seatmap is None
+        or seatmap["rows"] != flight.airplane.rows
+        or seatmap["seats_in_row"] != flight.airplane.seats_in_row
+    )
+
+
+def get_seatmap(flight):
+    key = seatmap_cache_key(flight.id)
+    try:
+        seatmap = cache.get(key)
+    except RedisError:
+        seatmap = None
+    if is_stale(seatmap, flight):
+        with use_primary():
+            seatmap = build_seatmap(flight)
+        try:
+            cache.set(key, seatmap, SEATMAP_CACHE_TIMEOUT)
+        except RedisError:
+            pass
+    return seatmap
+
+
+async def aget_seatmap(flight):
+    key = seatmap_cache_key(flight.id)
+    try:
+        seatmap = await cache.aget(key)
+    except RedisError:
+        seatmap = None
+    if is_stale(seatmap, flight):
+        with use_primary():
+            seatmap = await abuild_seatmap(flight)
+        try:
+            await cache.aset(key, seatmap, SEATMAP_CACHE_TIMEOUT)
+        except RedisError:
+            pass
+    return seatmap
+
+
+def invalidate_seatmap(flight_id):
+    def invalidate():
+        try:
+            cache.delete(seatmap_cache_key(flight_id))
+        except RedisError:
+            pass
+
+    transaction.on_commit(invalidate)
@@ -1,9 +1,14 @@
-from django.db import transaction
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from django.core.exceptions import ValidationError as DatabaseValidationError
 
 from airport.models import (
+    AIRPLANE_OVERLAP_CONSTRAINT,
     Crew,
     Airport,
     Route,
@@ -13,14 +18,129 @@ from airport.models import (
     Order,
     Ticket,
 )
+from airport.holds import (
+    HOLD_MAX_MINUTES,
+    allocate_seats,
+    claim_order_seats,
+    get_seatmap_with_holds,
+    release_order_claims,
+)
+from airport.images import variant_url, variant_urls
+from airport.itineraries import MAX_STOPS
+from airport.rosters import (
+    ROSTER_DAYS,
+    ROSTER_MAX_ASSIGNMENTS,
+    SCHEDULE_MAX_DAYS,
+    Duty,
+    describe_conflict,
+    find_airplane_overlaps,
+    find_crew_conflicts,
+)
+from airport.signals import change_sold_seats
 
 
 class CrewSerializer(serializers.ModelSerializer):
-    flights = serializers.StringRelatedField(many=True, read_only=True)
-
     class Meta:
         model = Crew
-        fields = ("id", "first_name", "last_name", "full_name", "flights")
+        fields = ("id", "first_name", "last_name", "full_name")
+
+
+class CrewListSerializer(CrewSerializer):
+    flight_count = serializers.IntegerField(read_only=True)
+    flights = serializers.StringRelatedField(
+        many=True,
+        read_only=True,
+        source="upcoming_flights",
+        help_text=f"Flights departing in the next {ROSTER_DAYS} days",
+    )
+
+    class Meta(CrewSerializer.Meta):
+        fields = CrewSerializer.Meta.fields + ("flight_count", "flights")
+
+
+class CrewScheduleSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(
+        required=False, help_text="Now by default"
+    )
+    end = serializers.DateTimeField(
+        required=False,
+        help_text=f"{ROSTER_DAYS} days after from by default, "
+        f"at most {SCHEDULE_MAX_DAYS} days after it",
+    )
+
+    def get_fields(self):
+        # the query parameters are from and to, from being a keyword
+        fields = super().get_fields()
+        return {"from": fields["start"], "to": fields["end"]}
+
+    def validate(self, data):
+        start = data.get("from") or timezone.now()
+        end = data.get("to") or start + timedelta(days=ROSTER_DAYS)
+        if end <= start:
+            raise ValidationError({"to": "Must be later than from."})
+        if end - start > timedelta(days=SCHEDULE_MAX_DAYS):
+            raise ValidationError(
+                {"to": f"Must be at most {SCHEDULE_MAX_DAYS} days after from."}
+            )
+        return {"from": start, "to": end}
+
+
+class RosterAssignmentSerializer(serializers.Serializer):
+    crew = serializers.IntegerField()
+    flight = serializers.IntegerField()
+
+
+class RosterSerializer(serializers.Serializer):
+    assignments = RosterAssignmentSerializer(
+        many=True, allow_empty=False, max_length=ROSTER_MAX_ASSIGNMENTS
+    )
+
+    def validate_assignments(self, assignments):
+        """Crew and flights are looked up once for the whole roster"""
+        crew_ids = {assignment["crew"] for assignment in assignments}
+        flight_ids = {assignment["flight"] for assignment in assignments}
+        missing_crew = crew_ids - set(
+            Crew.objects.filter(id__in=crew_ids).values_list("id", flat=True)
+        )
+        flights = {
+            flight_id: (departure_time, arrival_time)
+            for flight_id, departure_time, arrival_time in (
+                Flight.objects.filter(id__in=flight_ids).values_list(
+                    "id", "departure_time", "arrival_time"
+                )
+            )
+        }
+        errors = {}
+        if missing_crew:
+            errors["crew"] = f"Unknown crew: {sorted(missing_crew)}"
+        if missing_flights := flight_ids - set(flights):
+            errors["flight"] = f"Unknown flights: {sorted(missing_flights)}"
+        if errors:
+            raise ValidationError(errors)
+        return [
+            (crew_id, Duty(flight_id, *flights[flight_id], True))
+            for crew_id, flight_id in (
+                (assignment["crew"], assignment["flight"])
+                for assignment in assignments
+            )
+        ]
+
+
+class RosterConflictSerializer(serializers.Serializer):
+    crew = serializers.IntegerField(read_only=True)
+    flights = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+    message = serializers.CharField(read_only=True)
+
+
+class CrewFlightSerializer(serializers.ModelSerializer):
+    route = serializers.StringRelatedField(read_only=True)
+    airplane = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = Flight
+        fields = ("id", "route", "airplane", "departure_time", "arrival_time")
 
 
 class AirportSerializer(serializers.ModelSerializer):
@@ -48,11 +168,21 @@ class RouteReadSerializer(RouteSerializer):
 
 
 class AirplaneTypeSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = AirplaneType
-        fields = ("id", "name", "image")
+        fields = ("id", "name", "image", "image_variants")
         read_only_fields = ("id", "image")
 
+    @extend_schema_field(
+        serializers.DictField(
+            child=serializers.DictField(child=serializers.URLField())
+        )
+    )
+    def get_image_variants(self, obj):
+        return variant_urls(obj, self.context.get("request"))
+
 
 class AirplaneTypeImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -98,8 +228,66 @@ class FlightSerializer(serializers.ModelSerializer):
         Flight.validate_datetime(
             data["departure_time"], data["arrival_time"], ValidationError
         )
+        duty = Duty(
+            self.instance.id if self.instance else None,
+            data["departure_time"],
+            data["arrival_time"],
+            True,
+        )
+        self.validate_airplane_schedule(data, duty)
+        self.validate_crew_duties(data, duty)
         return data
 
+    def validate_airplane_schedule(self, data, duty):
+        airplane = data.get("airplane") or self.instance.airplane
+        overlaps = find_airplane_overlaps([(airplane.id, duty)])
+        if overlaps:
+            raise ValidationError(
+                {
+                    "airplane": [
+                        describe_conflict(airplane, first, second)
+                        for _, first, second in overlaps
+                    ]
+                }
+            )
+
+    def validate_crew_duties(self, data, duty):
+        if "crew" in data:
+            crew = data["crew"]
+        else:
+            crew = self.instance.crew.all() if self.instance else []
+        crew = {member.id: member for member in crew}
+        conflicts = find_crew_conflicts(
+            (crew_id, duty) for crew_id in crew
+        )
+        if conflicts:
+            raise ValidationError(
+                {
+                    "crew": [
+                        describe_conflict(crew[crew_id], first, second)
+                        for crew_id, first, second in conflicts
+                    ]
+                }
+            )
+
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as error:
+            diag = getattr(error.__cause__, "diag", None)
+            if getattr(diag, "constraint_name", None) != (
+                AIRPLANE_OVERLAP_CONSTRAINT
+            ):
+                raise
+            # another flight of the airplane was saved after validation
+            raise ValidationError(
+                {
+                    "airplane": "The airplane was just scheduled for an "
+                    "overlapping flight."
+                }
+            )
+
 
 class FlightListSerializer(FlightSerializer):
     airplane_type = serializers.CharField(
@@ -109,9 +297,7 @@ class FlightListSerializer(FlightSerializer):
         read_only=True, source="airplane.capacity"
     )
     available_seats = serializers.IntegerField(read_only=True)
-    airplane_type_image = serializers.ImageField(
-        read_only=True, source="airplane.airplane_type.image"
-    )
+    airplane_type_image = serializers.SerializerMethodField()
     route = serializers.StringRelatedField(read_only=True)
     crew = serializers.StringRelatedField(read_only=True, many=True)
 
@@ -128,11 +314,41 @@ class FlightListSerializer(FlightSerializer):
             "crew",
         )
 
+    @extend_schema_field(serializers.URLField(allow_null=True))
+    def get_airplane_type_image(self, obj):
+        """WebP thumbnail, the original image until it is generated"""
+        return variant_url(
+            obj.airplane.airplane_type,
+            "thumbnail",
+            request=self.context.get("request"),
+        )
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Fetches every distinct object only once per serializer instance,
+    so nested many=True serializers don't query for each item"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._objects = {}
+
+    def to_internal_value(self, data):
+        key = str(data)
+        if key not in self._objects:
+            self._objects[key] = super().to_internal_value(data)
+        return self._objects[key]
+
 
 class TicketSerializer(serializers.ModelSerializer):
+    flight = CachedPrimaryKeyRelatedField(
+        queryset=Flight.objects.select_related("airplane")
+    )
+
     class Meta:
         model = Ticket
         fields = ("row", "seat", "flight")
+        # sold seats are checked at once for the whole order
+        validators = []
 
     def validate(self, data):
         super().validate(data)
@@ -142,6 +358,23 @@ class TicketSerializer(serializers.ModelSerializer):
         return data
 
 
+class AutoTicketSerializer(serializers.Serializer):
+    flight = CachedPrimaryKeyRelatedField(
+        queryset=Flight.objects.select_related("airplane")
+    )
+    count = serializers.IntegerField(min_value=1, max_value=10, default=1)
+    adjacent = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data["adjacent"] and (
+            data["count"] > data["flight"].airplane.seats_in_row
+        ):
+            raise ValidationError(
+                {"count": "There are not so many seats in a row."}
+            )
+        return data
+
+
 class TicketFlightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
@@ -168,30 +401,176 @@ class FlightDetailSerializer(FlightSerializer):
         )
 
 
+class ItinerarySearchSerializer(serializers.Serializer):
+    source = serializers.CharField()
+    destination = serializers.CharField()
+    date = serializers.DateField()
+    max_stops = serializers.IntegerField(
+        min_value=0, max_value=MAX_STOPS, default=MAX_STOPS
+    )
+
+
+class ItinerarySerializer(serializers.Serializer):
+    stops = serializers.IntegerField(read_only=True)
+    departure_time = serializers.DateTimeField(read_only=True)
+    arrival_time = serializers.DateTimeField(read_only=True)
+    distance = serializers.IntegerField(read_only=True)
+    flights = FlightListSerializer(read_only=True, many=True)
+
+
+class SeatmapSerializer(serializers.Serializer):
+    rows = serializers.IntegerField(read_only=True)
+    seats_in_row = serializers.IntegerField(read_only=True)
+    occupied = serializers.CharField(
+        read_only=True,
+        help_text="Base64 bitmap of sold seats, row by row, "
+        "most significant bit first",
+    )
+    held = serializers.CharField(
+        read_only=True,
+        help_text="Base64 bitmap of temporarily held seats, "
+        "in the same layout",
+    )
+
+
+class SeatSerializer(serializers.Serializer):
+    row = serializers.IntegerField(min_value=1)
+    seat = serializers.IntegerField(min_value=1)
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    seats = SeatSerializer(many=True, allow_empty=False)
+    minutes = serializers.IntegerField(
+        min_value=1, max_value=HOLD_MAX_MINUTES, default=10
+    )
+
+    def validate_seats(self, seats):
+        airplane = self.context["flight"].airplane
+        for seat in seats:
+            Ticket.validate_seats(
+                seat["row"], seat["seat"], airplane, ValidationError
+            )
+        return list(
+            dict.fromkeys((seat["row"], seat["seat"]) for seat in seats)
+        )
+
+
+class SeatHoldReleaseSerializer(serializers.Serializer):
+    hold = serializers.CharField()
+
+
+class FlightSeatmapDetailSerializer(FlightDetailSerializer):
+    seatmap = serializers.SerializerMethodField()
+
+    class Meta(FlightSerializer.Meta):
+        fields = FlightSerializer.Meta.fields + (
+            "available_seats",
+            "seatmap",
+        )
+
+    @extend_schema_field(SeatmapSerializer)
+    def get_seatmap(self, obj):
+        if "seatmap" in self.context:
+            return self.context["seatmap"]
+        return get_seatmap_with_holds(obj)
+
+
 class OrderSerializer(serializers.ModelSerializer):
-    tickets = TicketSerializer(read_only=False, required=True, many=True)
+    tickets = TicketSerializer(read_only=False, required=False, many=True)
+    auto_tickets = AutoTicketSerializer(
+        write_only=True, required=False, many=True
+    )
 
     class Meta:
         model = Order
-        fields = ("id", "created_at", "tickets")
+        fields = ("id", "created_at", "tickets", "auto_tickets")
+
+    def validate(self, data):
+        if not data.get("tickets") and not data.get("auto_tickets"):
+            raise ValidationError(
+                "Order must have tickets or auto_tickets to allocate."
+            )
+        return data
+
+    @staticmethod
+    def ticket_error(row, seat, flight, message):
+        return ValidationError(
+            {f"row={row}, seat={seat}, flight={flight.id}": message}
+        )
 
     def create(self, validated_data):
+        user_id = validated_data["user"].id
+        tickets = validated_data.setdefault("tickets", [])
+        release_seats = claim_order_seats(user_id, tickets)
+        allocated = []
+        try:
+            for request in validated_data.pop("auto_tickets", []):
+                flight = request["flight"]
+                seats = allocate_seats(
+                    flight, request["count"], request["adjacent"], user_id
+                )
+                allocated.extend(
+                    {"flight": flight, "row": row, "seat": seat}
+                    for row, seat in seats
+                )
+            tickets.extend(allocated)
+            order = self.create_order(validated_data)
+        except Exception:
+            release_seats(sold=False)
+            release_order_claims(user_id, allocated)
+            raise
+
+        def release():
+            release_seats(sold=True)
+            release_order_claims(user_id, allocated)
+
+        transaction.on_commit(release)
+        return order
+
+    def create_order(self, validated_data):
         with transaction.atomic():
             tickets = validated_data.pop("tickets")
             order = Order.objects.create(**validated_data)
+
+            seats_by_flight = defaultdict(set)
             for ticket in tickets:
-                try:
-                    tk = Ticket.objects.create(order=order, **ticket)
-                except DatabaseValidationError:
-                    raise ValidationError(
-                        {
-                            f"row={tk.row}, "
-                            f"seat={tk.seat}, "
-                            f"flight={tk.flight.id}":
-                                "Tickets must be unique. "
-                                "This ticket has duplicates in this order."
-                        }
+                seats = seats_by_flight[ticket["flight"]]
+                seat = (ticket["row"], ticket["seat"])
+                if seat in seats:
+                    raise self.ticket_error(
+                        *seat,
+                        ticket["flight"],
+                        "Tickets must be unique. "
+                        "This ticket has duplicates in this order.",
                     )
+                seats.add(seat)
+
+            for flight, seats in seats_by_flight.items():
+                sold_seats = Ticket.objects.filter(
+                    flight=flight,
+                    row__in={row for row, _ in seats},
+                    seat__in={seat for _, seat in seats},
+                ).values_list("row", "seat")
+                for seat in sold_seats:
+                    if seat in seats:
+                        raise self.ticket_error(
+                            *seat,
+                            flight,
+                            "Tickets must be unique. "
+                            "This ticket is already sold.",
+                        )
+
+            try:
+                Ticket.objects.bulk_create(
+                    Ticket(order=order, **ticket) for ticket in tickets
+                )
+            except IntegrityError:
+                raise ValidationError(
+                    "Tickets must be unique. "
+                    "Some of these tickets were just sold."
+                )
+            for flight, seats in seats_by_flight.items():
+                change_sold_seats(flight.id, len(seats))
             return order
 
 
@@ -0,0 +1,207 @@
+from django.db.models import F, Q
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from airport.cache import bump_versions
+from airport.conditional import flight_stamp, order_stamp, user_orders_stamp
+from airport.models import (
+    Crew,
+    Airport,
+    Route,
+    AirplaneType,
+    Airplane,
+    Flight,
+    FlightSearchIndex,
+    Order,
+    Ticket,
+)
+from airport.search_index import refresh_search_index
+from airport.seatmap import invalidate_seatmap
+
+
+def change_sold_seats(flight_id, delta):
+    Flight.objects.filter(pk=flight_id).update(
+        sold_seats=F("sold_seats") + delta
+    )
+    FlightSearchIndex.objects.filter(flight_id=flight_id).update(
+        available_seats=F("available_seats") - delta
+    )
+    seats_changed(flight_id)
+
+
+def seats_changed(flight_id):
+    invalidate_seatmap(flight_id)
+    bump_versions(flight_stamp(flight_id), "flights")
+
+
+def ticket_changed(ticket):
+    user_id = (
+        Order.objects.filter(pk=ticket.order_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+    bump_versions(order_stamp(ticket.order_id), user_orders_stamp(user_id))
+
+
+@receiver(pre_save, sender=Ticket)
+def move_ticket_between_flights(sender, instance, raw, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old_flight_id = (
+        Ticket.objects.filter(pk=instance.pk)
+        .values_list("flight_id", flat=True)
+        .first()
+    )
+    if old_flight_id is not None and old_flight_id != instance.flight_id:
+        change_sold_seats(old_flight_id, -1)
+        change_sold_seats(instance.flight_id, 1)
+    else:
+        seats_changed(instance.flight_id)
+
+
+@receiver(post_save, sender=Ticket)
+def increment_sold_seats(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        change_sold_seats(instance.flight_id, 1)
+    ticket_changed(instance)
+
+
+@receiver(post_delete, sender=Ticket)
+def decrement_sold_seats(sender, instance, **kwargs):
+    change_sold_seats(instance.flight_id, -1)
+    ticket_changed(instance)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order(sender, instance, **kwargs):
+    bump_versions(
+        order_stamp(instance.id), user_orders_stamp(instance.user_id)
+    )
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def invalidate_airports(sender, **kwargs):
+    bump_versions("airports", "routes", "itineraries")
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_routes(sender, **kwargs):
+    bump_versions("routes", "itineraries")
+
+
+@receiver(post_save, sender=AirplaneType)
+@receiver(post_delete, sender=AirplaneType)
+def invalidate_airplane_types(sender, **kwargs):
+    bump_versions("airplane_types", "airplanes")
+
+
+@receiver(post_save, sender=Airplane)
+@receiver(post_delete, sender=Airplane)
+def invalidate_airplanes(sender, **kwargs):
+    bump_versions("airplanes")
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def invalidate_flight(sender, instance, **kwargs):
+    bump_versions(
+        flight_stamp(instance.id), "flights", "flight-schedule", "itineraries"
+    )
+
+
+@receiver(m2m_changed, sender=Flight.crew.through)
+def invalidate_flight_crew(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        # the crew member's flights may be unknown after a clear
+        bump_versions("crew")
+    else:
+        bump_versions(flight_stamp(instance.id), "flights")
+
+
+@receiver(post_save, sender=Crew)
+@receiver(post_delete, sender=Crew)
+def invalidate_crew(sender, **kwargs):
+    bump_versions("crew")
+
+
+def search_index_changed(raw, update_fields, indexed_fields):
+    """Whether a save may change search index rows, so image or other
+    partial saves do not rewrite the rows of every flight under them"""
+    return not raw and (
+        update_fields is None or not update_fields.isdisjoint(indexed_fields)
+    )
+
+
+@receiver(post_save, sender=Flight)
+def sync_flight_search_index(sender, instance, raw, update_fields, **kwargs):
+    # fixtures hold no search index rows, flights loaded after their
+    # routes and airplanes are indexed here
+    if raw or search_index_changed(
+        raw,
+        update_fields,
+        (
+            "route",
+            "route_id",
+            "airplane",
+            "airplane_id",
+            "departure_time",
+            "sold_seats",
+        ),
+    ):
+        refresh_search_index(Flight.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Route)
+def sync_route_search_index(sender, instance, raw, update_fields, **kwargs):
+    if search_index_changed(
+        raw,
+        update_fields,
+        ("source", "source_id", "destination", "destination_id"),
+    ):
+        refresh_search_index(Flight.objects.filter(route=instance))
+
+
+@receiver(post_save, sender=Airport)
+def sync_airport_search_index(
+    sender, instance, raw, update_fields, **kwargs
+):
+    if search_index_changed(raw, update_fields, ("closest_city",)):
+        refresh_search_index(
+            Flight.objects.filter(
+                Q(route__source=instance) | Q(route__destination=instance)
+            )
+        )
+
+
+@receiver(post_save, sender=Airplane)
+def sync_airplane_search_index(
+    sender, instance, raw, update_fields, **kwargs
+):
+    if search_index_changed(
+        raw,
+        update_fields,
+        ("rows", "seats_in_row", "airplane_type", "airplane_type_id"),
+    ):
+        refresh_search_index(Flight.objects.filter(airplane=instance))
+
+
+@receiver(post_save, sender=AirplaneType)
+def sync_airplane_type_search_index(
+    sender, instance, raw, update_fields, **kwargs
+):
+    if search_index_changed(raw, update_fields, ("name",)):
+        refresh_search_index(
+            Flight.objects.filter(airplane__airplane_type=instance)
+        )
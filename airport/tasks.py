@@ -0,0 +1,18 @@
+from celery import shared_task
+
+
+@shared_task
+def process_airplane_type_image(airplane_type_id: int, image: str) -> bool:
+    # imported here, the module is loaded with celery before the apps
+    from airport.images import generate_variants
+    from airport.models import AirplaneType
+
+    airplane_type = AirplaneType.objects.filter(
+        id=airplane_type_id, image=image
+    ).first()
+    if airplane_type is None:
+        # deleted or replaced by a newer upload meanwhile
+        return False
+    airplane_type.image_variants = generate_variants(airplane_type)
+    airplane_type.save(update_fields=("image_variants",))
+    return True
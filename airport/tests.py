@@ -1,21 +1,70 @@
+import base64
+import json
 import os
 import shutil
 import tempfile
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
 
 from PIL import Image
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.base import BaseCache
+from django.core.management import call_command, CommandError
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    connection,
+    transaction,
+)
 from django.db.models import Count, F
-from django.test import TestCase, override_settings
+from django.http import HttpResponse
+from django.test import (
+    LiveServerTestCase,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from redis import RedisError
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
 
-from airport.models import AirplaneType, Airplane, Airport, Route, Flight
+from airport.models import (
+    Crew,
+    AirplaneType,
+    Airplane,
+    Airport,
+    Route,
+    Flight,
+    FlightSearchIndex,
+    Order,
+    Ticket,
+)
+from airport.cache import OBJECT_STAMP_TIMEOUT, modified_key, version_key
+from airport.conditional import flight_stamp
+from airport.holds import seat_key
+from airport.images import VARIANT_SIZES
+from airport.rosters import airplane_overlaps
+from airport.schedules import ScheduleLoader
 from airport.serializers import (
     FlightListSerializer,
     FlightDetailSerializer,
 )
+from airport.tasks import process_airplane_type_image
+from airport_service.metrics import registry
+from airport_service.routers import (
+    ReplicaRouter,
+    ReplicaRoutingMiddleware,
+    use_primary,
+)
 
 
 annotated_flights = Flight.objects.all().annotate(
@@ -46,6 +95,12 @@ class TestFlightAPIView(TestCase):
             seats_in_row=10,
             airplane_type=cls.airplane_type,
         )
+        cls.other_airplane = Airplane.objects.create(
+            name="OtherAirplane",
+            rows=2,
+            seats_in_row=10,
+            airplane_type=cls.airplane_type,
+        )
 
     def setUp(self):
         self.user_admin = get_user_model().objects.create_superuser(
@@ -64,7 +119,30 @@ class TestFlightAPIView(TestCase):
         response = self.client.get(reverse("airport:flight-list"))
         serializer = FlightListSerializer(annotated_flights, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(serializer.data, response.data)
+        self.assertEqual(serializer.data, response.data["results"])
+
+    def test_flight_list_cursor_pagination(self):
+        for day in (27, 28, 29):
+            Flight.objects.create(
+                route=self.route,
+                airplane=self.airplane,
+                departure_time=datetime(year=2025, month=12, day=day),
+                arrival_time=datetime(year=2025, month=12, day=day, hour=12),
+            )
+        response = self.client.get(
+            reverse("airport:flight-list"), query_params={"page_size": 3}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNone(response.data["previous"])
+        self.assertTrue(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [flight["id"] for flight in response.data["results"]],
+            [self.flight.id],
+        )
+        self.assertIsNone(response.data["next"])
 
     def test_search_flight_by_source_cities(self):
         not_searched_port = Airport.objects.create(
@@ -77,7 +155,7 @@ class TestFlightAPIView(TestCase):
         )
         Flight.objects.create(
             route=not_searched_route,
-            airplane=self.airplane,
+            airplane=self.other_airplane,
             departure_time=datetime(year=2025, month=12, day=30),
             arrival_time=datetime(year=2025, month=12, day=31),
         )
@@ -100,7 +178,7 @@ class TestFlightAPIView(TestCase):
         )
         Flight.objects.create(
             route=not_searched_route,
-            airplane=self.airplane,
+            airplane=self.other_airplane,
             departure_time=datetime(year=2025, month=12, day=30),
             arrival_time=datetime(year=2025, month=12, day=31),
         )
@@ -186,6 +264,1528 @@ class TestFlightAPIView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
+    def test_airplane_overlap(self):
+        data = {
+            "airplane": self.airplane.id,
+            "route": self.route.id,
+            "departure_time": timezone.make_aware(datetime(2025, 12, 30, 12)),
+            "arrival_time": timezone.make_aware(datetime(2026, 1, 1)),
+        }
+        response = self.client.post(reverse("airport:flight-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"flight {self.flight.id}", response.data["airplane"][0])
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Flight.objects.bulk_create(
+                [
+                    Flight(
+                        route=self.route,
+                        airplane=self.airplane,
+                        departure_time=data["departure_time"],
+                        arrival_time=data["arrival_time"],
+                    )
+                ]
+            )
+
+        # an empty period would overlap nothing
+        data["departure_time"] = data["arrival_time"]
+        response = self.client.post(reverse("airport:flight-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        data["departure_time"] = self.flight.arrival_time
+        response = self.client.post(reverse("airport:flight-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        out = StringIO()
+        call_command("report_flight_overlaps", "--fail", stdout=out)
+        self.assertIn("Found 0 overlapping flight pairs", out.getvalue())
+
+    @mock.patch.object(Flight, "validate_constraints")
+    @mock.patch(
+        "airport.serializers.FlightSerializer.validate_airplane_schedule"
+    )
+    def test_airplane_overlap_after_validation(self, *mocks):
+        data = {
+            "airplane": self.airplane.id,
+            "route": self.route.id,
+            "departure_time": timezone.make_aware(datetime(2025, 12, 30, 12)),
+            "arrival_time": timezone.make_aware(datetime(2026, 1, 1)),
+        }
+        response = self.client.post(reverse("airport:flight-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("airplane", response.data)
+
+        data["departure_time"] = self.flight.arrival_time
+        with mock.patch(
+            "rest_framework.serializers.ModelSerializer.save",
+            side_effect=IntegrityError("route does not exist"),
+        ):
+            with self.assertRaises(IntegrityError):
+                self.client.post(reverse("airport:flight-list"), data)
+
+
+class TestSampleData(TestCase):
+    def test_search_sample_flights(self):
+        call_command(
+            "loaddata",
+            os.path.join(settings.BASE_DIR, "fixtures", "data.json"),
+            # ids of permissions differ in the test database
+            exclude=["admin", "auth", "sessions", "token_blacklist"],
+            verbosity=0,
+        )
+        self.assertEqual(
+            FlightSearchIndex.objects.count(), Flight.objects.count()
+        )
+        response = APIClient().get(
+            reverse("airport:flight-list"),
+            query_params={"sources": "Kiev", "date": "2025-12-24"},
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+class TestFlightSoldSeats(TestCase):
+    def setUp(self):
+        airplane_type = AirplaneType.objects.create(name="AirplaneType1")
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        airplane = Airplane.objects.create(
+            name="TestAirplane",
+            rows=2,
+            seats_in_row=10,
+            airplane_type=airplane_type,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        self.user = get_user_model().objects.create_user(
+            email="user@user.com", password="12345"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_order_create_and_delete_update_sold_seats(self):
+        response = self.client.post(
+            reverse("airport:order-list"),
+            data={
+                "tickets": [
+                    {"row": 1, "seat": 1, "flight": self.flight.id},
+                    {"row": 1, "seat": 2, "flight": self.flight.id},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.sold_seats, 2)
+
+        Order.objects.get(pk=response.data["id"]).delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.sold_seats, 0)
+
+    def test_search_index_follows_flight_changes(self):
+        index = self.flight.search_index
+        self.assertEqual(
+            (index.source_city, index.destination_city, index.available_seats),
+            ("A", "B", 20),
+        )
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=1, seat=1, flight=self.flight, order=order)
+        self.flight.route.source.closest_city = "C"
+        self.flight.route.source.save()
+
+        index.refresh_from_db()
+        self.assertEqual((index.source_city, index.available_seats), ("C", 19))
+
+        response = self.client.get(
+            reverse("airport:flight-list"),
+            query_params={"sources": "C", "date": "2025-12-30", "seats": 19},
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+        response = self.client.get(
+            reverse("airport:flight-list"), query_params={"seats": 20}
+        )
+        self.assertEqual(len(response.data["results"]), 0)
+
+    @mock.patch("airport.signals.refresh_search_index")
+    def test_search_index_skips_unindexed_changes(self, refresh):
+        airplane_type = self.flight.airplane.airplane_type
+        airplane_type.image_variants = {"thumbnail": {}}
+        airplane_type.save(update_fields=("image_variants",))
+        self.flight.airplane.save(update_fields=("name",))
+        refresh.assert_not_called()
+
+        airplane_type.save(update_fields=("name",))
+        refresh.assert_called_once()
+
+    def test_rebuild_sold_seats_command(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(row=1, seat=1, flight=self.flight, order=order)
+        Flight.objects.filter(pk=self.flight.id).update(sold_seats=5)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_sold_seats", "--check", stdout=StringIO())
+        call_command("rebuild_sold_seats", stdout=StringIO())
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.sold_seats, 1)
+
+
+class TestOrderCreate(TestCase):
+    def setUp(self):
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="TestAirplane",
+                rows=3,
+                seats_in_row=3,
+                airplane_type=AirplaneType.objects.create(name="Type1"),
+            ),
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@user.com", password="12345"
+            )
+        )
+
+    def create_order(self, seats):
+        return self.client.post(
+            reverse("airport:order-list"),
+            data={
+                "tickets": [
+                    {"row": row, "seat": seat, "flight": self.flight.id}
+                    for row, seat in seats
+                ]
+            },
+            format="json",
+        )
+
+    def test_order_create_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as single_ticket:
+            response = self.create_order([(1, 1)])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as group_booking:
+            response = self.create_order(
+                [(row, seat) for row in (2, 3) for seat in (1, 2, 3)]
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            len(single_ticket.captured_queries),
+            len(group_booking.captured_queries),
+        )
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.sold_seats, 7)
+
+    def test_order_with_duplicate_tickets(self):
+        response = self.create_order([(1, 1), (1, 2), (1, 1)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(
+            f"row=1, seat=1, flight={self.flight.id}", response.data
+        )
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_with_sold_ticket(self):
+        self.create_order([(2, 2)])
+        response = self.create_order([(1, 1), (2, 2)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(
+            f"row=2, seat=2, flight={self.flight.id}", response.data
+        )
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_order_with_seat_out_of_airplane(self):
+        response = self.create_order([(4, 1)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="TestAirplane",
+                rows=3,
+                seats_in_row=3,
+                airplane_type=AirplaneType.objects.create(name="Type1"),
+            ),
+            departure_time=timezone.make_aware(datetime(2025, 12, 30)),
+            arrival_time=timezone.make_aware(datetime(2025, 12, 31)),
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@admin", password="admin"
+        )
+        order = Order.objects.create(user=self.admin)
+        for seat in (1, 2):
+            Ticket.objects.create(row=1, seat=seat, flight=flight, order=order)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_export_tickets_csv(self):
+        response = self.client.get(
+            reverse("airport:export", kwargs={"name": "tickets"})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("id,order,user,flight,source"))
+        self.assertIn("admin@admin,", lines[1])
+        self.assertIn(",Source,A,Destination,B,", lines[1])
+
+    def test_export_flights_ndjson(self):
+        response = self.client.get(
+            reverse("airport:export", kwargs={"name": "flights"}),
+            query_params={"output": "ndjson"},
+        )
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["source_city"], "A")
+        self.assertEqual(rows[0]["sold_seats"], 2)
+        self.assertEqual(
+            rows[0]["departure_time"], "2025-12-30T00:00:00+00:00"
+        )
+
+    def test_export_admin_only(self):
+        self.admin.is_staff = False
+        response = self.client.get(
+            reverse("airport:export", kwargs={"name": "orders"})
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command("export_data", "orders", "--format=ndjson", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["user"], "admin@admin")
+
+
+class TestLoadSchedule(TestCase):
+    def setUp(self):
+        Airport.objects.create(name="Source", closest_city="A")
+        Airport.objects.create(name="Destination", closest_city="B")
+        Airplane.objects.create(
+            name="TestAirplane",
+            rows=3,
+            seats_in_row=3,
+            airplane_type=AirplaneType.objects.create(name="Type1"),
+        )
+        Crew.objects.create(first_name="John", last_name="Doe")
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def load(self, name, content, *args):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as file:
+            file.write(content)
+        out, err = StringIO(), StringIO()
+        call_command("load_schedule", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_load_csv_reports_bad_rows(self):
+        out, err = self.load(
+            "schedule.csv",
+            "source,source_city,destination,destination_city,distance,"
+            "airplane,departure_time,arrival_time,crew\n"
+            "Source,A,Destination,B,500,TestAirplane,"
+            "2025-12-30T10:00,2025-12-30T12:00,John Doe\n"
+            "Source,A,Destination,B,,TestAirplane,"
+            "2025-12-31T10:00,2025-12-31T12:00,\n"
+            "Source,A,Source,A,,TestAirplane,"
+            "2026-01-01T10:00,2026-01-01T12:00,\n"
+            "Source,A,Destination,B,,Unknown,"
+            "2026-01-02T10:00,2026-01-02T12:00,\n"
+            "Source,A,Destination,B,,TestAirplane,"
+            "2026-01-03T12:00,2026-01-03T10:00,\n"
+            "Source,A,Destination,B,,TestAirplane,"
+            "2025-12-30T10:00,2025-12-30T12:00,\n"
+            "Source,A,Destination,B,,TestAirplane,"
+            "2026-01-04T10:00,2026-01-04T10:00,\n",
+            "--batch-size=2",
+        )
+        self.assertEqual(out.strip(), "Loaded 2 flights, 5 rows failed")
+        self.assertEqual(
+            [line.split(":")[0] for line in err.splitlines()],
+            ["row 4", "row 5", "row 6", "row 7", "row 8"],
+        )
+        self.assertIn("Unknown airplane 'Unknown'", err)
+        route = Route.objects.get()
+        self.assertEqual(route.distance, 500)
+        flight = Flight.objects.get(departure_time__day=30)
+        self.assertEqual(flight.route, route)
+        self.assertEqual(
+            list(flight.crew.values_list("last_name", flat=True)), ["Doe"]
+        )
+        self.assertTrue(hasattr(flight, "search_index"))
+
+    def test_load_after_failed_batch(self):
+        create_flights = ScheduleLoader.create_flights
+        calls = []
+
+        def fail_first_batch(loader, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise DatabaseError("conflicting key value")
+            return create_flights(loader, *args)
+
+        with mock.patch.object(
+            ScheduleLoader, "create_flights", fail_first_batch
+        ):
+            out, err = self.load(
+                "schedule.csv",
+                "source,source_city,destination,destination_city,distance,"
+                "airplane,departure_time,arrival_time\n"
+                "Source,A,Destination,B,500,TestAirplane,"
+                "2025-12-30T10:00,2025-12-30T12:00\n"
+                "Source,A,Destination,B,,TestAirplane,"
+                "2025-12-31T10:00,2025-12-31T12:00\n",
+                "--batch-size=1",
+            )
+        self.assertEqual(out.strip(), "Loaded 1 flights, 1 rows failed")
+        self.assertEqual(Flight.objects.get().route, Route.objects.get())
+
+    def test_load_crew_conflicts(self):
+        for hour in (11, 12):
+            Airplane.objects.create(
+                name=f"Airplane{hour}",
+                rows=3,
+                seats_in_row=3,
+                airplane_type=AirplaneType.objects.get(),
+            )
+        out, err = self.load(
+            "schedule.ndjson",
+            "\n".join(
+                json.dumps(
+                    {
+                        "source": "Source",
+                        "source_city": "A",
+                        "destination": "Destination",
+                        "destination_city": "B",
+                        "distance": 500,
+                        "airplane": airplane,
+                        "departure_time": f"2025-12-30T{hour}:00",
+                        "arrival_time": f"2025-12-30T{hour + 2}:00",
+                        "crew": "John Doe",
+                    }
+                )
+                for hour, airplane in (
+                    (10, "TestAirplane"),
+                    (11, "Airplane11"),
+                    (12, "Airplane12"),
+                )
+            ),
+        )
+        self.assertEqual(out.strip(), "Loaded 2 flights, 1 rows failed")
+        self.assertIn("row 2: John Doe would be on", err)
+
+    def test_load_airplane_overlaps(self):
+        out, err = self.load(
+            "schedule.csv",
+            "source,source_city,destination,destination_city,distance,"
+            "airplane,departure_time,arrival_time\n"
+            "Source,A,Destination,B,500,TestAirplane,"
+            "2025-12-30T10:00,2025-12-30T12:00\n"
+            "Source,A,Destination,B,,TestAirplane,"
+            "2025-12-30T11:00,2025-12-30T13:00\n"
+            "Source,A,Destination,B,,TestAirplane,"
+            "2025-12-30T12:00,2025-12-30T14:00\n",
+        )
+        self.assertEqual(out.strip(), "Loaded 2 flights, 1 rows failed")
+        self.assertIn("row 3: TestAirplane would be on", err)
+
+    def test_load_json_dry_run(self):
+        rows = [
+            {
+                "source": "Source",
+                "source_city": "A",
+                "destination": "Destination",
+                "destination_city": "B",
+                "distance": 500,
+                "airplane": "TestAirplane",
+                "departure_time": f"2025-12-{day}T10:00:00+00:00",
+                "arrival_time": f"2025-12-{day}T12:00:00+00:00",
+                "crew": ["John Doe"],
+            }
+            for day in (29, 30)
+        ]
+        rows.append({"source": "Source"})
+        out, err = self.load("schedule.json", json.dumps(rows), "--dry-run")
+        self.assertEqual(out.strip(), "Validated 2 flights, 1 rows failed")
+        self.assertIn("row 3: Missing fields: source_city", err)
+        self.assertFalse(Flight.objects.exists())
+        self.assertFalse(Route.objects.exists())
+
+
+class TestGenerateDataset(TestCase):
+    def test_generate_dataset(self):
+        out = StringIO()
+        call_command(
+            "generate_dataset",
+            "--airports=5",
+            "--airplanes=3",
+            "--flights=20",
+            "--users=5",
+            "--start=2030-01-01",
+            "--batch-size=7",
+            stdout=out,
+        )
+        self.assertEqual(Flight.objects.count(), 20)
+        self.assertEqual(Crew.objects.count(), 12)
+        self.assertFalse(
+            Flight.objects.annotate(tickets_count=Count("tickets"))
+            .exclude(sold_seats=F("tickets_count"))
+            .exists()
+        )
+        self.assertIn(f"{Ticket.objects.count()} tickets", out.getvalue())
+        flights = list(
+            Flight.objects.order_by("airplane", "departure_time").values_list(
+                "airplane", "departure_time", "arrival_time"
+            )
+        )
+        for previous, flight in zip(flights, flights[1:]):
+            if previous[0] == flight[0]:
+                self.assertGreater(flight[1], previous[2])
+        self.assertEqual(FlightSearchIndex.objects.count(), 20)
+
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", "--flights=1", stdout=out)
+
+    def generate(self, prefix):
+        call_command(
+            "generate_dataset",
+            "--airports=5",
+            "--airplanes=3",
+            "--flights=20",
+            "--users=5",
+            "--start=2030-01-01",
+            "--seed=7",
+            f"--prefix={prefix}",
+            stdout=StringIO(),
+        )
+        flights = (
+            Flight.objects.filter(airplane__name__startswith=f"{prefix} ")
+            .select_related("airplane", "route__source", "route__destination")
+            .annotate(tickets_count=Count("tickets"))
+            .order_by("departure_time", "id")
+        )
+        return [
+            (
+                flight.route.source.name.removeprefix(prefix),
+                flight.route.destination.name.removeprefix(prefix),
+                flight.airplane.name.removeprefix(prefix),
+                flight.departure_time,
+                flight.arrival_time,
+                flight.tickets_count,
+            )
+            for flight in flights
+        ]
+
+    def test_same_seed_gives_same_dataset(self):
+        first = self.generate("First")
+        self.assertEqual(len(first), 20)
+        self.assertEqual(first, self.generate("Second"))
+
+        # emails of "second" would clash with the users of "Second"
+        with self.assertRaises(CommandError):
+            self.generate("second")
+
+
+class TestWaitForDb(TestCase):
+    @mock.patch.dict(os.environ, {"POSTGRES_PASSWORD": "password"})
+    @mock.patch("airport.management.commands.wait_for_db.time.sleep")
+    def test_retries_direct_connection(self, sleep):
+        connect = connection.Database.connect
+        tries = []
+
+        def starting_db(**params):
+            tries.append(params)
+            if len(tries) == 1:
+                raise connection.Database.OperationalError("starting up")
+            return connect(**params)
+
+        out = StringIO()
+        with mock.patch.object(
+            connection.Database, "connect", side_effect=starting_db
+        ), mock.patch.object(connection, "cursor") as cursor:
+            call_command("wait_for_db", stdout=out)
+        self.assertIn("Connected to DB successfully", out.getvalue())
+        self.assertEqual(len(tries), 2)
+        self.assertLessEqual(tries[0]["connect_timeout"], 5)
+        sleep.assert_called_once()
+        cursor.assert_not_called()
+
+
+class TestBenchmark(LiveServerTestCase):
+    def test_seed_and_replay(self):
+        for _ in range(2):
+            out = StringIO()
+            call_command(
+                "benchmark",
+                f"--base-url={self.live_server_url}",
+                "--seed",
+                "--flights=120",
+                "--requests=10",
+                "--concurrency=2",
+                stdout=out,
+            )
+            self.assertIn("10 requests in", out.getvalue())
+        self.assertEqual(Flight.objects.count(), 240)
+        self.assertEqual(list(airplane_overlaps()), [])
+
+
+class TestCrewRoster(TestCase):
+    def setUp(self):
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        airplane = Airplane.objects.create(
+            name="TestAirplane",
+            rows=3,
+            seats_in_row=3,
+            airplane_type=AirplaneType.objects.create(name="Type1"),
+        )
+        self.other_airplane = Airplane.objects.create(
+            name="OtherAirplane",
+            rows=3,
+            seats_in_row=3,
+            airplane_type=airplane.airplane_type,
+        )
+        self.crew = Crew.objects.create(first_name="John", last_name="Doe")
+        Crew.objects.create(first_name="Jane", last_name="Doe")
+        now = timezone.now()
+        self.flights = {}
+        for days in (-400, -30, 2, 20):
+            flight = Flight.objects.create(
+                route=route,
+                airplane=airplane,
+                departure_time=now + timedelta(days=days),
+                arrival_time=now + timedelta(days=days, hours=2),
+            )
+            flight.crew.add(self.crew)
+            self.flights[days] = flight
+        self.client = APIClient()
+
+    def test_crew_list_shows_upcoming_flights(self):
+        response = self.client.get(reverse("airport:crew-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        jane, john = response.data["results"]
+        self.assertEqual(jane["flight_count"], 0)
+        self.assertEqual(jane["flights"], [])
+        self.assertEqual(john["flight_count"], 4)
+        self.assertEqual(john["flights"], [str(self.flights[2])])
+
+    def test_crew_schedule(self):
+        url = reverse("airport:crew-schedule", kwargs={"pk": self.crew.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [flight["id"] for flight in response.data], [self.flights[2].id]
+        )
+
+        start = timezone.now() - timedelta(days=31)
+        response = self.client.get(
+            url,
+            query_params={
+                "from": start.isoformat(),
+                "to": (start + timedelta(days=30)).isoformat(),
+            },
+        )
+        self.assertEqual(
+            [flight["id"] for flight in response.data], [self.flights[-30].id]
+        )
+        self.assertEqual(response.data[0]["airplane"], "TestAirplane")
+
+        response = self.client.get(
+            url,
+            query_params={
+                "from": start.isoformat(),
+                "to": (start + timedelta(days=60)).isoformat(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("to", response.data)
+
+    def admin_client(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@admin", password="admin"
+            )
+        )
+
+    def test_flight_crew_conflicts(self):
+        self.admin_client()
+        flight = self.flights[2]
+        data = {
+            "airplane": self.other_airplane.id,
+            "route": flight.route_id,
+            "departure_time": flight.departure_time + timedelta(hours=1),
+            "arrival_time": flight.arrival_time + timedelta(hours=1),
+            "crew": [self.crew.id],
+        }
+        response = self.client.post(reverse("airport:flight-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"flight {flight.id}", response.data["crew"][0])
+
+        data["departure_time"] = flight.arrival_time
+        data["arrival_time"] = flight.arrival_time + timedelta(hours=2)
+        response = self.client.post(reverse("airport:flight-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        data["departure_time"] = flight.departure_time
+        data["airplane"] = Airplane.objects.create(
+            name="ThirdAirplane",
+            rows=3,
+            seats_in_row=3,
+            airplane_type=self.other_airplane.airplane_type,
+        ).id
+        response = self.client.put(
+            reverse(
+                "airport:flight-detail", kwargs={"pk": self.flights[20].id}
+            ),
+            data,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data["crew"]), 2)
+
+    def test_validate_roster(self):
+        self.admin_client()
+        jane = Crew.objects.get(first_name="Jane")
+        flight = self.flights[2]
+        overlapping = Flight.objects.create(
+            route=flight.route,
+            airplane=self.other_airplane,
+            departure_time=flight.departure_time + timedelta(hours=1),
+            arrival_time=flight.arrival_time + timedelta(hours=1),
+        )
+        assignments = [
+            {"crew": jane.id, "flight": flight.id},
+            {"crew": jane.id, "flight": overlapping.id},
+            {"crew": jane.id, "flight": self.flights[20].id},
+            {"crew": self.crew.id, "flight": overlapping.id},
+        ]
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                reverse("airport:crew-validate-roster"),
+                {"assignments": assignments},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(
+                (conflict["crew"], conflict["flights"])
+                for conflict in response.data
+            ),
+            sorted(
+                [
+                    (jane.id, [flight.id, overlapping.id]),
+                    (self.crew.id, [flight.id, overlapping.id]),
+                ]
+            ),
+        )
+
+        assignments.append({"crew": jane.id, "flight": 0})
+        response = self.client.post(
+            reverse("airport:crew-validate-roster"),
+            {"assignments": assignments},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UnavailableCache(BaseCache):
+    """Cache backend of a Redis server that is down"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+
+    def unavailable(self, *args, **kwargs):
+        raise RedisError("Connection refused")
+
+    add = get = set = touch = delete = clear = incr = unavailable
+    get_many = set_many = delete_many = has_key = unavailable
+
+
+class TestSeatHold(TestCase):
+    def setUp(self):
+        cache.clear()
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="TestAirplane",
+                rows=2,
+                seats_in_row=4,
+                airplane_type=AirplaneType.objects.create(name="Type1"),
+            ),
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@user.com", password="12345"
+            )
+        )
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="other@user.com", password="12345"
+            )
+        )
+        self.hold_url = reverse(
+            "airport:flight-hold", kwargs={"pk": self.flight.id}
+        )
+
+    def order(self, client, row, seat):
+        return client.post(
+            reverse("airport:order-list"),
+            data={
+                "tickets": [
+                    {"row": row, "seat": seat, "flight": self.flight.id}
+                ]
+            },
+            format="json",
+        )
+
+    def test_held_seat_is_rejected_for_others(self):
+        response = self.client.post(
+            self.hold_url,
+            data={"seats": [{"row": 1, "seat": 2}], "minutes": 5},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.other_client.post(
+            self.hold_url,
+            data={"seats": [{"row": 1, "seat": 3}, {"row": 1, "seat": 2}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.order(self.other_client, 1, 2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            reverse("airport:flight-seatmap", kwargs={"pk": self.flight.id})
+        )
+        self.assertEqual(
+            base64.b64decode(response.data["held"]), bytes((0b01000000,))
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.order(self.client, 1, 2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(cache.get(seat_key(self.flight.id, 1, 2)))
+
+    def test_release_hold(self):
+        hold = self.client.post(
+            self.hold_url,
+            data={"seats": [{"row": 2, "seat": 4}]},
+            format="json",
+        ).data["hold"]
+        response = self.other_client.delete(
+            self.hold_url, data={"hold": hold}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.delete(
+            self.hold_url, data={"hold": hold}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.order(self.other_client, 2, 4)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_hold_expires_at(self):
+        response = self.client.post(
+            self.hold_url,
+            data={"seats": [{"row": 1, "seat": 1}], "minutes": 5},
+            format="json",
+        )
+        expires_at = datetime.fromisoformat(response.json()["expires_at"])
+        self.assertAlmostEqual(
+            expires_at.timestamp(),
+            (timezone.now() + timedelta(minutes=5)).timestamp(),
+            delta=5,
+        )
+
+    def test_holds_of_flight_are_read_at_once(self):
+        client = mock.MagicMock()
+        client.zrangebyscore.return_value = [b"1-2", b"2-4"]
+        with mock.patch(
+            "airport.holds.holds_client", return_value=client
+        ), mock.patch.object(cache, "get_many") as get_many:
+            hold = self.client.post(
+                self.hold_url,
+                data={"seats": [{"row": 1, "seat": 2}], "minutes": 5},
+                format="json",
+            ).data["hold"]
+            response = self.client.get(
+                reverse(
+                    "airport:flight-seatmap", kwargs={"pk": self.flight.id}
+                )
+            )
+            get_many.return_value = {
+                seat_key(self.flight.id, 1, 2): {
+                    "user": response.wsgi_request.user.id,
+                    "hold": hold,
+                }
+            }
+            self.client.delete(
+                self.hold_url, data={"hold": hold}, format="json"
+            )
+
+        key = cache.make_and_validate_key(f"seat-holds-{self.flight.id}")
+        zadd = client.pipeline.return_value.zadd
+        self.assertEqual(zadd.call_args.args[0], key)
+        self.assertEqual(list(zadd.call_args.args[1]), ["1-2"])
+        client.zrangebyscore.assert_called_once()
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(
+            base64.b64decode(response.data["held"]),
+            bytes((0b01000001,)),
+        )
+        client.pipeline.return_value.zrem.assert_called_once_with(key, "1-2")
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "airport.tests.UnavailableCache"}}
+    )
+    def test_redis_outage(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.order(self.client, 1, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.order(self.other_client, 1, 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            reverse("airport:flight-seatmap", kwargs={"pk": self.flight.id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            base64.b64decode(response.data["occupied"])[0], 0b10000000
+        )
+        self.assertEqual(base64.b64decode(response.data["held"])[0], 0)
+
+        response = self.client.post(
+            self.hold_url,
+            data={"seats": [{"row": 1, "seat": 2}]},
+            format="json",
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
+class TestAutoSeatAllocation(TestCase):
+    def setUp(self):
+        cache.clear()
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name="TestAirplane",
+                rows=2,
+                seats_in_row=4,
+                airplane_type=AirplaneType.objects.create(name="Type1"),
+            ),
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@user.com", password="12345"
+            )
+        )
+
+    def order(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("airport:order-list"), data=data, format="json"
+            )
+
+    def test_adjacent_seats_skip_sold_and_held(self):
+        self.order(tickets=[{"row": 1, "seat": 2, "flight": self.flight.id}])
+        self.client.post(
+            reverse("airport:flight-hold", kwargs={"pk": self.flight.id}),
+            data={"seats": [{"row": 2, "seat": 1}]},
+            format="json",
+        )
+        response = self.order(
+            auto_tickets=[
+                {"flight": self.flight.id, "count": 3, "adjacent": True}
+            ]
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted((t["row"], t["seat"]) for t in response.data["tickets"]),
+            [(2, 2), (2, 3), (2, 4)],
+        )
+        self.assertIsNone(cache.get(seat_key(self.flight.id, 2, 3)))
+
+        response = self.order(
+            auto_tickets=[{"flight": self.flight.id, "count": 3}]
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.sold_seats, 7)
+
+    def test_not_enough_free_seats(self):
+        response = self.order(
+            auto_tickets=[{"flight": self.flight.id, "count": 9}]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.order(
+            auto_tickets=[
+                {"flight": self.flight.id, "count": 5, "adjacent": True}
+            ]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.order(tickets=[])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.assertIsNone(cache.get(seat_key(self.flight.id, 1, 1)))
+
+
+class TestFlightSeatmap(TestCase):
+    def setUp(self):
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        airplane = Airplane.objects.create(
+            name="TestAirplane",
+            rows=2,
+            seats_in_row=6,
+            airplane_type=AirplaneType.objects.create(name="AirplaneType1"),
+        )
+        self.flight = Flight.objects.create(
+            route=route,
+            airplane=airplane,
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        self.client = APIClient()
+        order = Order.objects.create(
+            user=get_user_model().objects.create_user(
+                email="user@user.com", password="12345"
+            )
+        )
+        for row, seat in ((1, 1), (2, 6)):
+            Ticket.objects.create(
+                row=row, seat=seat, flight=self.flight, order=order
+            )
+
+    def test_seatmap_action(self):
+        response = self.client.get(
+            reverse("airport:flight-seatmap", kwargs={"pk": self.flight.id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rows"], 2)
+        self.assertEqual(response.data["seats_in_row"], 6)
+        self.assertEqual(
+            base64.b64decode(response.data["occupied"]),
+            bytes((0b10000000, 0b00010000)),
+        )
+
+    def test_retrieve_with_seatmap(self):
+        response = self.client.get(
+            reverse("airport:flight-detail", kwargs={"pk": self.flight.id}),
+            query_params={"seatmap": "true"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("sold_tickets", response.data)
+        self.assertEqual(
+            base64.b64decode(response.data["seatmap"]["occupied"]),
+            bytes((0b10000000, 0b00010000)),
+        )
+
+
+class TestAsyncFlightViews(TestCase):
+    def setUp(self):
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Source", closest_city="A"),
+            destination=Airport.objects.create(
+                name="Destination", closest_city="B"
+            ),
+            distance=100,
+        )
+        airplane_type = AirplaneType.objects.create(name="AirplaneType1")
+        self.flights = [
+            Flight.objects.create(
+                route=route,
+                airplane=Airplane.objects.create(
+                    name=f"TestAirplane{number}",
+                    rows=2,
+                    seats_in_row=6,
+                    airplane_type=airplane_type,
+                ),
+                departure_time=datetime(2025, 12, 30, hour),
+                arrival_time=datetime(2025, 12, 31, hour),
+            )
+            for number, hour in enumerate((3, 1, 2, 2))
+        ]
+        order = Order.objects.create(
+            user=get_user_model().objects.create_user(
+                email="user@user.com", password="12345"
+            )
+        )
+        Ticket.objects.create(
+            row=2, seat=6, flight=self.flights[0], order=order
+        )
+        self.client = APIClient()
+
+    def get(self, name, query_params=None, **kwargs):
+        return (
+            self.client.get(
+                reverse(f"airport:{name}", kwargs=kwargs),
+                query_params=query_params,
+            ).json(),
+            async_to_sync(self.async_client.get)(
+                reverse(f"airport:async-{name}", kwargs=kwargs),
+                query_params=query_params,
+            ).json(),
+        )
+
+    def test_flight_list_pages(self):
+        flights, async_flights = [], []
+        page, async_page = self.get(
+            "flight-list", {"page_size": 2, "sources": "A"}
+        )
+        while True:
+            flights.extend(page["results"])
+            async_flights.extend(async_page["results"])
+            if not async_page["next"]:
+                break
+            async_page = async_to_sync(self.async_client.get)(
+                async_page["next"]
+            ).json()
+            page = self.client.get(page["next"]).json()
+        self.assertEqual(len(async_flights), 4)
+        self.assertEqual(flights, async_flights)
+
+    def test_flight_detail_and_seatmap(self):
+        flight_id = self.flights[0].id
+        for query_params in (None, {"seatmap": "true"}):
+            detail, async_detail = self.get(
+                "flight-detail", query_params, pk=flight_id
+            )
+            self.assertEqual(detail, async_detail)
+
+        seatmap, async_seatmap = self.get("flight-seatmap", pk=flight_id)
+        self.assertEqual(seatmap, async_seatmap)
+        response = async_to_sync(self.async_client.get)(
+            reverse("airport:async-flight-detail", kwargs={"pk": 0})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @mock.patch.object(
+        SimpleRateThrottle, "THROTTLE_RATES", {"anon": "2/min", "user": None}
+    )
+    def test_async_views_are_throttled(self):
+        cache.clear()
+        url = reverse("airport:async-flight-list")
+        for _ in range(2):
+            response = async_to_sync(self.async_client.get)(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = async_to_sync(self.async_client.get)(
+            reverse(
+                "airport:async-flight-detail",
+                kwargs={"pk": self.flights[0].id},
+            )
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertIn("Retry-After", response)
+
+
+class TestReferenceCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="admin@admin", password="admin"
+            )
+        )
+        Airport.objects.create(name="CachedPort", closest_city="A")
+
+    def test_airport_list_is_cached(self):
+        self.client.get(reverse("airport:airport-list"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("airport:airport-list"))
+        self.assertContains(response, "CachedPort")
+
+        stats = self.client.get(reverse("airport:reference-cache-stats"))
+        self.assertEqual(stats.data["airports"], {"hit": 1, "miss": 1})
+
+    def test_airport_change_invalidates_cache(self):
+        self.client.get(reverse("airport:airport-list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.create(name="NewPort", closest_city="B")
+        response = self.client.get(reverse("airport:airport-list"))
+        self.assertContains(response, "NewPort")
+
+
+@override_settings(DATABASE_REPLICA_LAG=0)
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = Flight.objects.create(
+            route=Route.objects.create(
+                source=Airport.objects.create(name="S", closest_city="A"),
+                destination=Airport.objects.create(name="D", closest_city="B"),
+                distance=100,
+            ),
+            airplane=Airplane.objects.create(
+                name="TestAirplane",
+                rows=2,
+                seats_in_row=2,
+                airplane_type=AirplaneType.objects.create(name="Type1"),
+            ),
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        self.user = get_user_model().objects.create_user(
+            email="user@user.com", password="12345"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertNotModified(self, url, **params):
+        response = self.client.get(url, query_params=params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            cached = self.client.get(
+                url, query_params=params, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        return response
+
+    def order(self, row, seat):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("airport:order-list"),
+                data={
+                    "tickets": [
+                        {"row": row, "seat": seat, "flight": self.flight.id}
+                    ]
+                },
+                format="json",
+            )
+
+    def test_flight_detail_and_list(self):
+        detail_url = reverse(
+            "airport:flight-detail", kwargs={"pk": self.flight.id}
+        )
+        list_url = reverse("airport:flight-list")
+        detail = self.assertNotModified(detail_url)
+        self.assertTrue(detail.has_header("Last-Modified"))
+        flights = self.assertNotModified(list_url)
+
+        self.order(1, 1)
+        for url, response in ((detail_url, detail), (list_url, flights)):
+            changed = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+            self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+        self.assertNotModified(list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight.crew.add(
+                Crew.objects.create(first_name="A", last_name="B")
+            )
+        response = self.client.get(detail_url)
+        self.assertEqual(response.data["crew"], ["A B"])
+
+        response = self.client.get(detail_url, query_params={"seatmap": 1})
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_orders(self):
+        orders = self.assertNotModified(reverse("airport:order-list"))
+        order_id = self.order(1, 2).data["id"]
+        response = self.client.get(
+            reverse("airport:order-list"),
+            HTTP_IF_NONE_MATCH=orders["ETag"],
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertNotModified(
+            reverse("airport:order-detail", kwargs={"pk": order_id})
+        )
+
+    def test_object_stamps_expire(self):
+        with mock.patch.object(
+            cache, "set_many", wraps=cache.set_many
+        ) as set_many:
+            self.client.get(
+                reverse(
+                    "airport:flight-detail", kwargs={"pk": self.flight.id}
+                )
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                self.flight.save()
+        timeouts = {
+            key: call.args[1]
+            for call in set_many.call_args_list
+            for key in call.args[0]
+        }
+        for key in (
+            version_key(flight_stamp(self.flight.id)),
+            modified_key(flight_stamp(self.flight.id)),
+        ):
+            self.assertEqual(timeouts[key], OBJECT_STAMP_TIMEOUT)
+        self.assertIsNone(timeouts[version_key("airports")])
+        self.assertIsNone(timeouts[modified_key("flights")])
+
+
+class TestItinerarySearch(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.airports = {
+            city: Airport.objects.create(name=f"{city}Port", closest_city=city)
+            for city in ("A", "B", "C")
+        }
+        self.airplane_type = AirplaneType.objects.create(name="Type1")
+        self.client = APIClient()
+
+    def create_flight(self, source, destination, departure, arrival):
+        route, _ = Route.objects.get_or_create(
+            source=self.airports[source],
+            destination=self.airports[destination],
+            defaults={"distance": 100},
+        )
+        return Flight.objects.create(
+            route=route,
+            airplane=Airplane.objects.create(
+                name=f"TestAirplane{Airplane.objects.count()}",
+                rows=2,
+                seats_in_row=2,
+                airplane_type=self.airplane_type,
+            ),
+            departure_time=timezone.make_aware(departure),
+            arrival_time=timezone.make_aware(arrival),
+        )
+
+    def search(self, **params):
+        return self.client.get(
+            reverse("airport:itinerary-search"),
+            query_params={"source": "A", "destination": "C", **params},
+        )
+
+    def test_direct_and_connecting_itineraries(self):
+        day = timezone.localdate() + timedelta(days=1)
+
+        def at(hour):
+            return datetime.combine(day, time(hour))
+
+        direct = self.create_flight("A", "C", at(6), at(9))
+        first_leg = self.create_flight("A", "B", at(7), at(8))
+        second_leg = self.create_flight("B", "C", at(10), at(12))
+        self.create_flight("B", "C", at(8), at(11))
+
+        response = self.search(date=day.isoformat())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                [flight["id"] for flight in itinerary["flights"]]
+                for itinerary in response.data
+            ],
+            [[direct.id], [first_leg.id, second_leg.id]],
+        )
+        self.assertEqual(response.data[1]["distance"], 200)
+
+        response = self.search(date=day.isoformat(), max_stops=0)
+        self.assertEqual(len(response.data), 1)
+
+    @mock.patch("airport.views.MAX_ITINERARIES", 2)
+    def test_full_flights_do_not_use_up_results(self):
+        day = timezone.localdate() + timedelta(days=1)
+
+        def at(hour):
+            return datetime.combine(day, time(hour))
+
+        full = [
+            self.create_flight("A", "C", at(hour), at(hour + 1))
+            for hour in (6, 7, 8)
+        ]
+        Flight.objects.filter(id__in=[flight.id for flight in full]).update(
+            sold_seats=4
+        )
+        bookable = self.create_flight("A", "C", at(9), at(10))
+
+        response = self.search(date=day.isoformat())
+        self.assertEqual(
+            [itinerary["flights"][0]["id"] for itinerary in response.data],
+            [bookable.id],
+        )
+
+    @mock.patch("airport.itineraries._index", None)
+    @mock.patch("airport.itineraries.get_version", side_effect=RedisError)
+    def test_redis_outage(self, get_version):
+        day = timezone.localdate() + timedelta(days=1)
+        flight = self.create_flight(
+            "A",
+            "C",
+            datetime.combine(day, time(6)),
+            datetime.combine(day, time(9)),
+        )
+        response = self.search(date=day.isoformat())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["flights"][0]["id"], flight.id)
+
+    def test_search_requires_date(self):
+        response = self.search()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestReplicaRouter(SimpleTestCase):
+    # TestCase would keep every read on the primary in its atomic block
+    def setUp(self):
+        cache.clear()
+        # only counted by the routing, no replica connection is opened
+        patcher = mock.patch.dict(settings.DATABASES, {"replica_0": {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ReplicaRouter()
+        self.router.replicas = ["replica_0"]
+        self.user = get_user_model()(pk=1, email="user@user.com")
+        self.factory = RequestFactory()
+
+    def route(self, request):
+        """Database the view of the request would read flights from"""
+        databases = []
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: databases.append(
+                self.router.db_for_read(Flight)
+            )
+            or HttpResponse(status=201)
+        )
+        middleware(request)
+        return databases[0]
+
+    def test_safe_requests_read_from_replicas(self):
+        self.assertEqual(self.router.db_for_read(Flight), "default")
+        self.assertEqual(self.route(self.factory.get("/")), "replica_0")
+        self.assertEqual(self.route(self.factory.post("/")), "default")
+        self.assertEqual(self.router.db_for_write(Flight), "default")
+
+    def test_user_reads_own_writes(self):
+        request = self.factory.get("/")
+        request.user = self.user
+        self.assertEqual(self.route(request), "replica_0")
+
+        request = self.factory.post("/")
+        request.user = self.user
+        self.route(request)
+        request = self.factory.get("/")
+        request.user = self.user
+        self.assertEqual(self.route(request), "default")
+        request = self.factory.get("/")
+        self.assertEqual(self.route(request), "replica_0")
+
+    def test_use_primary(self):
+        databases = []
+
+        def view(request):
+            with use_primary():
+                databases.append(self.router.db_for_read(Flight))
+            databases.append(self.router.db_for_read(Flight))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(self.factory.get("/"))
+        self.assertEqual(databases, ["default", "replica_0"])
+
+    @mock.patch("airport_service.routers.cache")
+    def test_redis_outage(self, broken):
+        broken.get.side_effect = broken.set.side_effect = RedisError
+        request = self.factory.post("/")
+        request.user = self.user
+        self.assertEqual(self.route(request), "default")
+        request = self.factory.get("/")
+        request.user = self.user
+        self.assertEqual(self.route(request), "default")
+
+
+class TestMetrics(TestCase):
+    def test_metrics_endpoint(self):
+        client = APIClient()
+        client.get(reverse("airport:airport-list"))
+        response = client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        labels = 'view="airport:airport-list",method="GET"'
+        for metric in (
+            "api_request_duration_seconds_count",
+            "api_db_queries_count",
+            "api_serialization_duration_seconds_count",
+            "api_render_duration_seconds_count",
+            "api_response_bytes_count",
+        ):
+            self.assertContains(response, f"{metric}{{{labels}}}")
+        self.assertContains(
+            response, f'api_requests_total{{{labels},status="200"}}'
+        )
+
+    def test_async_view_queries(self):
+        registry.histograms["queries"].series.clear()
+        async_to_sync(self.async_client.get)(
+            reverse("airport:async-flight-list")
+        )
+        _, total = registry.histograms["queries"].series[
+            ("airport:async-flight-list", "GET")
+        ]
+        self.assertGreater(total, 0)
+
+    def test_async_view_serialization(self):
+        registry.histograms["serialization"].series.clear()
+        async_to_sync(self.async_client.get)(
+            reverse("airport:async-flight-list")
+        )
+        _, total = registry.histograms["serialization"].series[
+            ("airport:async-flight-list", "GET")
+        ]
+        self.assertGreater(total, 0)
+
 
 TEMPDIR = tempfile.mkdtemp()
 
@@ -224,3 +1824,62 @@ class TestAirplaneTypeImage(TestCase):
 
         self.airplane_type.refresh_from_db()
         self.assertTrue(os.path.exists(self.airplane_type.image.path))
+
+    @mock.patch("airport.views.process_airplane_type_image.delay")
+    def test_image_variants_are_generated_in_background(self, delay):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.new(mode="RGB", size=(1200, 600), color="black")
+            exif = Image.Exif()
+            exif[0x010F] = "TestCamera"
+            img.save(ntf, format="JPEG", exif=exif)
+            ntf.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse(
+                        "airport:airplanetype-upload-image",
+                        kwargs={"pk": self.airplane_type.id},
+                    ),
+                    data={"image": ntf},
+                )
+        self.airplane_type.refresh_from_db()
+        delay.assert_called_once_with(
+            self.airplane_type.id, self.airplane_type.image.name
+        )
+        self.assertEqual(self.airplane_type.image_variants, {})
+
+        self.assertTrue(
+            process_airplane_type_image(
+                self.airplane_type.id, self.airplane_type.image.name
+            )
+        )
+        self.airplane_type.refresh_from_db()
+        variants = self.airplane_type.image_variants
+        for size_name, size in VARIANT_SIZES.items():
+            for extension, file_format in (("webp", "WEBP"), ("jpeg", "JPEG")):
+                path = os.path.join(TEMPDIR, variants[size_name][extension])
+                with Image.open(path) as variant:
+                    self.assertEqual(variant.format, file_format)
+                    self.assertEqual(variant.width, size[0])
+                    self.assertFalse(variant.getexif())
+
+        Flight.objects.create(
+            route=Route.objects.create(
+                source=Airport.objects.create(name="S", closest_city="A"),
+                destination=Airport.objects.create(name="D", closest_city="B"),
+                distance=100,
+            ),
+            airplane=Airplane.objects.create(
+                name="TestAirplane",
+                rows=2,
+                seats_in_row=2,
+                airplane_type=self.airplane_type,
+            ),
+            departure_time=datetime(year=2025, month=12, day=30),
+            arrival_time=datetime(year=2025, month=12, day=31),
+        )
+        response = self.client.get(reverse("airport:flight-list"))
+        self.assertTrue(
+            response.data["results"][0]["airplane_type_image"].endswith(
+                variants["thumbnail"]["webp"]
+            )
+        )
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from airport.async_views import flight_list, flight_detail, flight_seatmap
 from airport.views import (
     RouteViewSet,
     CrewViewSet,
@@ -9,6 +10,9 @@ from airport.views import (
     AirplaneViewSet,
     FlightViewSet,
     OrderViewSet,
+    ExportView,
+    ItinerarySearchView,
+    ReferenceCacheStatsView,
 )
 
 app_name = "airport"
@@ -24,4 +28,26 @@ router.register("orders", OrderViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "itineraries/",
+        ItinerarySearchView.as_view(),
+        name="itinerary-search",
+    ),
+    path("async/flights/", flight_list, name="async-flight-list"),
+    path(
+        "async/flights/<int:pk>/",
+        flight_detail,
+        name="async-flight-detail",
+    ),
+    path(
+        "async/flights/<int:pk>/seatmap/",
+        flight_seatmap,
+        name="async-flight-seatmap",
+    ),
+    path("export/<str:name>/", ExportView.as_view(), name="export"),
+    path(
+        "reference-cache-stats/",
+        ReferenceCacheStatsView.as_view(),
+        name="reference-cache-stats",
+    ),
 ]
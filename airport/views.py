@@ -1,12 +1,30 @@
-from django.db.models import Prefetch, F, Count
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Prefetch, F
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework import status
 from rest_framework import mixins
 
+from airport.cache import CachedReadMixin, get_stats
+from airport.conditional import (
+    FLIGHT_STAMPS,
+    ORDER_STAMPS,
+    conditional_get,
+    flight_stamp,
+    order_stamp,
+    user_orders_stamp,
+)
+from airport.exports import EXPORTS, EXPORT_FORMATS, export_lines
+from airport.holds import get_seatmap_with_holds, hold_seats, release_hold
+from airport.itineraries import MAX_ITINERARIES, search_itineraries
 from airport.models import (
     Crew,
     Airport,
@@ -17,9 +35,32 @@ from airport.models import (
     Order,
     Ticket,
 )
+from airport.pagination import (
+    CrewPagination,
+    AirportPagination,
+    RoutePagination,
+    AirplaneTypePagination,
+    AirplanePagination,
+    FlightPagination,
+    OrderPagination,
+)
 from airport.permissions import AuthenticatedReadCreate
+from airport.rosters import (
+    crew_flights,
+    describe_conflict,
+    find_crew_conflicts,
+    roster_flights,
+    with_flight_count,
+)
+from airport.tasks import process_airplane_type_image
+from airport_service.metrics import TimedSerializationMixin, timed_data
 from airport.serializers import (
     CrewSerializer,
+    CrewListSerializer,
+    CrewScheduleSerializer,
+    CrewFlightSerializer,
+    RosterSerializer,
+    RosterConflictSerializer,
     AirportSerializer,
     RouteSerializer,
     RouteReadSerializer,
@@ -30,6 +71,12 @@ from airport.serializers import (
     FlightSerializer,
     FlightListSerializer,
     FlightDetailSerializer,
+    FlightSeatmapDetailSerializer,
+    SeatmapSerializer,
+    SeatHoldSerializer,
+    SeatHoldReleaseSerializer,
+    ItinerarySearchSerializer,
+    ItinerarySerializer,
     OrderSerializer,
     OrderAdminDetailSerializer,
     OrderReadSerializer,
@@ -37,24 +84,89 @@ from airport.serializers import (
 
 
 class CrewViewSet(
+    TimedSerializationMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     GenericViewSet,
 ):
-    queryset = Crew.objects.prefetch_related(
-        Prefetch(
-            "flights",
-            queryset=Flight.objects.select_related(
-                "route__source",
-                "route__destination",
-            ),
+    queryset = Crew.objects.all()
+    pagination_class = CrewPagination
+
+    def get_serializer_class(self):
+        if self.action in ("list", "retrieve"):
+            return CrewListSerializer
+        if self.action == "schedule":
+            return CrewFlightSerializer
+        if self.action == "validate_roster":
+            return RosterSerializer
+        return CrewSerializer
+
+    def get_queryset(self):
+        qs = self.queryset
+        if self.action in ("list", "retrieve"):
+            qs = with_flight_count(qs).prefetch_related(
+                Prefetch(
+                    "flights",
+                    queryset=roster_flights(),
+                    to_attr="upcoming_flights",
+                )
+            )
+        return qs
+
+    @extend_schema(
+        parameters=[CrewScheduleSerializer],
+        responses=CrewFlightSerializer(many=True),
+    )
+    @action(detail=True, methods=["GET"])
+    def schedule(self, request, pk):
+        """Flights of the crew member departing between from and to"""
+        crew = self.get_object()
+        params = CrewScheduleSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        flights = crew_flights(
+            params.validated_data["from"], params.validated_data["to"]
+        ).filter(crew=crew)
+        serializer = CrewFlightSerializer(flights, many=True)
+        return Response(
+            timed_data(request, serializer), status=status.HTTP_200_OK
         )
+
+    @extend_schema(
+        request=RosterSerializer,
+        responses=RosterConflictSerializer(many=True),
     )
-    serializer_class = CrewSerializer
+    @action(detail=False, methods=["POST"], url_path="validate-roster")
+    def validate_roster(self, request):
+        """Check crew assignments to flights against each other and
+        against the flights the crew already have. Returns the
+        overlapping flights, nothing is assigned."""
+        serializer = RosterSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        conflicts = find_crew_conflicts(
+            serializer.validated_data["assignments"]
+        )
+        serializer = RosterConflictSerializer(
+            [
+                {
+                    "crew": crew_id,
+                    "flights": [first.flight_id, second.flight_id],
+                    "message": describe_conflict(
+                        f"Crew {crew_id}", first, second
+                    ),
+                }
+                for crew_id, first, second in conflicts
+            ],
+            many=True,
+        )
+        return Response(
+            timed_data(request, serializer), status=status.HTTP_200_OK
+        )
 
 
 class AirportViewSet(
+    TimedSerializationMixin,
+    CachedReadMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -62,15 +174,21 @@ class AirportViewSet(
 ):
     queryset = Airport.objects.all()
     serializer_class = AirportSerializer
+    pagination_class = AirportPagination
+    cache_name = "airports"
 
 
 class RouteViewSet(
+    TimedSerializationMixin,
+    CachedReadMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     GenericViewSet,
 ):
     queryset = Route.objects.select_related("source", "destination")
+    pagination_class = RoutePagination
+    cache_name = "routes"
 
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
@@ -79,6 +197,8 @@ class RouteViewSet(
 
 
 class AirplaneTypeViewSet(
+    TimedSerializationMixin,
+    CachedReadMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -86,6 +206,8 @@ class AirplaneTypeViewSet(
     GenericViewSet,
 ):
     queryset = AirplaneType.objects.all()
+    pagination_class = AirplaneTypePagination
+    cache_name = "airplane_types"
 
     def get_serializer_class(self):
         if self.action == "upload_image":
@@ -99,23 +221,34 @@ class AirplaneTypeViewSet(
         permission_classes=[IsAdminUser],
     )
     def upload_image(self, request, pk):
-        """Action to upload an image for AirplaneType"""
+        """Action to upload an image for AirplaneType.
+        Resized variants are generated in the background"""
         airplane_type = self.get_object()
         serializer = AirplaneTypeImageSerializer(
             airplane_type, data=request.data
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        airplane_type = serializer.save(image_variants={})
+        image = airplane_type.image.name
+        transaction.on_commit(
+            lambda: process_airplane_type_image.delay(airplane_type.id, image)
+        )
+        return Response(
+            timed_data(request, serializer), status=status.HTTP_200_OK
+        )
 
 
 class AirplaneViewSet(
+    TimedSerializationMixin,
+    CachedReadMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     GenericViewSet,
 ):
     queryset = Airplane.objects.select_related("airplane_type")
+    pagination_class = AirplanePagination
+    cache_name = "airplanes"
 
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
@@ -123,45 +256,67 @@ class AirplaneViewSet(
         return AirplaneSerializer
 
 
-class FlightViewSet(ModelViewSet):
+def with_available_seats(queryset):
+    return queryset.annotate(
+        available_seats=(
+            F("airplane__rows") * F("airplane__seats_in_row")
+            - F("sold_seats")
+        )
+    )
+
+
+def search_flights(queryset, params):
+    if sources := params.get("sources"):
+        queryset = queryset.filter(
+            search_index__source_city__in=sources.split(",")
+        )
+    if destinations := params.get("destinations"):
+        queryset = queryset.filter(
+            search_index__destination_city__in=destinations.split(",")
+        )
+    if date := params.get("date"):
+        queryset = queryset.filter(search_index__departure_date=date)
+    seats = params.get("seats", "")
+    if seats.isdigit():
+        queryset = queryset.filter(search_index__available_seats__gte=seats)
+    return queryset
+
+
+class FlightViewSet(TimedSerializationMixin, ModelViewSet):
     queryset = Flight.objects.prefetch_related("crew").select_related(
         "airplane__airplane_type",
         "route__destination",
         "route__source",
     )
+    pagination_class = FlightPagination
 
     def get_serializer_class(self):
         if self.action == "list":
             return FlightListSerializer
         if self.action == "retrieve":
+            if self.seatmap_requested():
+                return FlightSeatmapDetailSerializer
             return FlightDetailSerializer
+        if self.action == "seatmap":
+            return SeatmapSerializer
+        if self.action == "hold":
+            return SeatHoldSerializer
         return FlightSerializer
 
+    def seatmap_requested(self):
+        return self.request.query_params.get("seatmap") in ("true", "1")
+
     def get_queryset(self):
+        if self.action in ("seatmap", "hold"):
+            return Flight.objects.select_related("airplane")
         qs = self.queryset
         if self.action in ("list", "retrieve"):
-            qs = qs.annotate(
-                available_seats=(
-                    F("airplane__rows") * F("airplane__seats_in_row")
-                    - Count("tickets")
-                )
-            )
-        if self.action == "retrieve":
+            qs = with_available_seats(qs)
+        if self.action == "retrieve" and not self.seatmap_requested():
             qs = qs.prefetch_related("tickets")
 
         if self.action == "list":
-            if sources := self.request.query_params.get("sources"):
-                qs = qs.filter(
-                    route__source__closest_city__in=sources.split(",")
-                )
-            if destinations := self.request.query_params.get("destinations"):
-                qs = qs.filter(
-                    route__destination__closest_city__in=destinations.split(
-                        ","
-                    )
-                )
-            if date := self.request.query_params.get("date"):
-                qs = qs.filter(departure_time__date=date)
+            qs = search_flights(qs, self.request.query_params)
         return qs
 
     @extend_schema(
@@ -185,13 +340,145 @@ class FlightViewSet(ModelViewSet):
                 description="filter flights by departure "
                             "time in YYYY-MM-DD format",
             ),
+            OpenApiParameter(
+                name="seats",
+                type=int,
+                many=False,
+                description="filter flights with at least "
+                            "this many available seats",
+            ),
         ]
     )
+    @conditional_get(lambda request, **kwargs: ("flights",) + FLIGHT_STAMPS)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="seatmap",
+                type=bool,
+                many=False,
+                description="return sold seats as a compact seat map "
+                            "instead of the sold tickets list",
+            ),
+        ]
+    )
+    @conditional_get(
+        # holds expire on their own, seat maps are never conditional
+        lambda request, pk: (
+            None
+            if request.query_params.get("seatmap") in ("true", "1")
+            else (flight_stamp(pk),) + FLIGHT_STAMPS
+        )
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=True, methods=["GET"])
+    def seatmap(self, request, pk):
+        """Sold and held seats of the flight as base64 bitmaps"""
+        flight = self.get_object()
+        return Response(
+            get_seatmap_with_holds(flight), status=status.HTTP_200_OK
+        )
+
+    @extend_schema(methods=["DELETE"], request=SeatHoldReleaseSerializer)
+    @action(
+        detail=True,
+        methods=["POST", "DELETE"],
+        permission_classes=[IsAuthenticated],
+    )
+    def hold(self, request, pk):
+        """Hold seats of the flight for a few minutes before ordering them,
+        or release a hold by its token"""
+        if request.method == "DELETE":
+            serializer = SeatHoldReleaseSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            if not release_hold(
+                serializer.validated_data["hold"], request.user.id
+            ):
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        flight = self.get_object()
+        serializer = SeatHoldSerializer(
+            data=request.data, context={"flight": flight}
+        )
+        serializer.is_valid(raise_exception=True)
+        hold = hold_seats(
+            flight,
+            serializer.validated_data["seats"],
+            request.user.id,
+            serializer.validated_data["minutes"],
+        )
+        return Response(hold, status=status.HTTP_201_CREATED)
+
+
+def bookable_itineraries(itineraries):
+    """Itineraries with free seats on every flight, in the given order.
+    Flights are loaded for a page of candidates at a time, so full
+    flights don't push bookable itineraries past the results limit."""
+    for start in range(0, len(itineraries), MAX_ITINERARIES):
+        page = itineraries[start:start + MAX_ITINERARIES]
+        flights = with_available_seats(
+            FlightViewSet.queryset.filter(
+                id__in={
+                    flight_id
+                    for itinerary in page
+                    for flight_id in itinerary["flights"]
+                }
+            )
+        )
+        flights = {flight.id: flight for flight in flights}
+        for itinerary in page:
+            legs = [
+                flights[flight_id]
+                for flight_id in itinerary["flights"]
+                if flight_id in flights
+            ]
+            if len(legs) != len(itinerary["flights"]) or any(
+                leg.available_seats <= 0 for leg in legs
+            ):
+                continue
+            yield {
+                "stops": len(legs) - 1,
+                "departure_time": legs[0].departure_time,
+                "arrival_time": legs[-1].arrival_time,
+                "distance": itinerary["distance"],
+                "flights": legs,
+            }
+
+
+class ItinerarySearchView(APIView):
+    @extend_schema(
+        parameters=[ItinerarySearchSerializer],
+        responses=ItinerarySerializer(many=True),
+    )
+    def get(self, request, *args, **kwargs):
+        """Direct and connecting flights between two cities
+        departing on the given date"""
+        params = ItinerarySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        itineraries = search_itineraries(
+            params.validated_data["source"],
+            params.validated_data["destination"],
+            params.validated_data["date"],
+            params.validated_data["max_stops"],
+        )
+        results = list(
+            islice(bookable_itineraries(itineraries), MAX_ITINERARIES)
+        )
+        serializer = ItinerarySerializer(
+            results, many=True, context={"request": request}
+        )
+        return Response(
+            timed_data(request, serializer), status=status.HTTP_200_OK
+        )
+
 
 class OrderViewSet(
+    TimedSerializationMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -207,6 +494,7 @@ class OrderViewSet(
             ),
         )
     )
+    pagination_class = OrderPagination
 
     def get_serializer_class(self):
         if self.action == "retrieve" and self.request.user.is_staff:
@@ -224,7 +512,61 @@ class OrderViewSet(
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @conditional_get(
+        lambda request: (user_orders_stamp(request.user.id),) + ORDER_STAMPS
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(
+        lambda request, pk: (order_stamp(pk),) + ORDER_STAMPS
+    )
     def retrieve(self, request, *args, **kwargs):
         """Admins can retrieve order details of any User.
         By default, User can retrieve only their own orders."""
         return super().retrieve(request, *args, **kwargs)
+
+
+class ReferenceCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """Hit and miss counters of the reference data cache"""
+        return Response(get_stats(), status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="output",
+                type=str,
+                many=False,
+                enum=EXPORT_FORMATS,
+                description="csv (default) or ndjson",
+            ),
+        ],
+        responses={(200, "text/csv"): str},
+    )
+    def get(self, request, name, *args, **kwargs):
+        """Stream all flights, orders or tickets as CSV or NDJSON"""
+        if name not in EXPORTS:
+            raise NotFound(f"Choose one of: {', '.join(EXPORTS)}")
+        file_format = request.query_params.get("output", "csv")
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"output": f"Choose one of: {', '.join(EXPORT_FORMATS)}"}
+            )
+        response = StreamingHttpResponse(
+            export_lines(name, file_format),
+            content_type=(
+                "text/csv" if file_format == "csv"
+                else "application/x-ndjson"
+            ),
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{name}.{file_format}"'
+        )
+        return response
@@ -2,7 +2,7 @@ import os
 
 from celery import Celery
 
-from user.tasks import flush_invalid_tokens
+from user.tasks import purge_expired_tokens
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "airport_service.settings")
@@ -21,6 +21,6 @@ def debug_task(self):
 def setup_periodic_tasks(sender, **kwargs):
     sender.add_periodic_task(
         45.0,
-        flush_invalid_tokens.s(),
-        name="flush invalid refresh tokens every 45 seconds",
+        purge_expired_tokens.s(),
+        name="purge expired refresh tokens in batches every 45 seconds",
     )
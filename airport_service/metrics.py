@@ -0,0 +1,312 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from user.tokens import get_purge_stats
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+INSTRUMENTED_NAMESPACES = ("airport", "user")
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, (None, 0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = format_labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{{{label_text},le=\"{bound}\"}} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+def format_labels(labels):
+    view, method = labels
+    return f'view="{view}",method="{method}"'
+
+
+class Registry:
+    """Per-process aggregates of the instrumented API requests"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {
+            "wall": Histogram(
+                "api_request_duration_seconds",
+                "Wall time of the request",
+                SECONDS_BUCKETS,
+            ),
+            "db": Histogram(
+                "api_db_duration_seconds",
+                "Time spent in database queries",
+                SECONDS_BUCKETS,
+            ),
+            "queries": Histogram(
+                "api_db_queries",
+                "Number of database queries",
+                QUERIES_BUCKETS,
+            ),
+            "serialization": Histogram(
+                "api_serialization_duration_seconds",
+                "Time spent building serializer data",
+                SECONDS_BUCKETS,
+            ),
+            "render": Histogram(
+                "api_render_duration_seconds",
+                "Time spent rendering the response body",
+                SECONDS_BUCKETS,
+            ),
+            "bytes": Histogram(
+                "api_response_bytes",
+                "Size of the response body",
+                BYTES_BUCKETS,
+            ),
+        }
+        self.statuses = {}
+
+    def observe(self, labels, status_code, **values):
+        with self.lock:
+            for name, value in values.items():
+                self.histograms[name].observe(labels, value)
+            key = labels + (status_code,)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def render(self):
+        with self.lock:
+            lines = [
+                "# HELP api_requests_total Number of requests",
+                "# TYPE api_requests_total counter",
+            ]
+            for (view, method, status_code), count in sorted(
+                self.statuses.items()
+            ):
+                lines.append(
+                    f"api_requests_total{{{format_labels((view, method))},"
+                    f'status="{status_code}"}} {count}'
+                )
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+# timer of the async request, seen by the worker threads of its queries
+async_timer = ContextVar("metrics_async_timer", default=None)
+
+
+def time_async_query(execute, sql, params, many, context):
+    timer = async_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_async_timer(sender, connection, **kwargs):
+    if time_async_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_async_query)
+
+
+class MetricsMiddleware:
+    """Records wall time, DB time and query count, serialization and
+    rendering time and response size of requests to the airport and user APIs.
+    Under ASGI the queries run in worker threads on connections the
+    middleware can't wrap per request, so every connection times them
+    for the request found in the context."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_async_timer(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        self.observe(
+            request,
+            response,
+            wall=time.perf_counter() - started,
+            db=timer.seconds,
+            queries=timer.count,
+        )
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = async_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            async_timer.reset(token)
+        self.observe(
+            request,
+            response,
+            wall=time.perf_counter() - started,
+            db=timer.seconds,
+            queries=timer.count,
+        )
+        return response
+
+    @staticmethod
+    def observe(request, response, **values):
+        match = request.resolver_match
+        if match is None or match.namespace not in INSTRUMENTED_NAMESPACES:
+            return
+        registry.observe(
+            (match.view_name, request.method),
+            response.status_code,
+            serialization=getattr(request, "serialization_seconds", 0.0),
+            render=getattr(request, "render_seconds", 0.0),
+            bytes=(0 if response.streaming else len(response.content)),
+            **values,
+        )
+
+
+def add_serialization_time(request, seconds):
+    # DRF requests wrap the request seen by the middleware
+    request = getattr(request, "_request", request)
+    request.serialization_seconds = (
+        getattr(request, "serialization_seconds", 0.0) + seconds
+    )
+
+
+def timed_data(request, serializer):
+    """serializer.data, timed as serialization of the request"""
+    started = time.perf_counter()
+    data = serializer.data
+    add_serialization_time(request, time.perf_counter() - started)
+    return data
+
+
+class TimedSerializationMixin:
+    """Times serializer.data of the serializers of a generic view"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        to_representation = serializer.to_representation
+        request = self.request
+
+        def timed_representation(instance):
+            started = time.perf_counter()
+            try:
+                return to_representation(instance)
+            finally:
+                add_serialization_time(
+                    request, time.perf_counter() - started
+                )
+
+        serializer.to_representation = timed_representation
+        return serializer
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        content = super().render(data, accepted_media_type, renderer_context)
+        request = (renderer_context or {}).get("request")
+        if request is not None:
+            request._request.render_seconds = time.perf_counter() - started
+        return content
+
+
+def render_token_purge():
+    stats = get_purge_stats()
+    if not stats:
+        return ""
+    lines = []
+    for name, metric_type, value, help_text in (
+        ("token_purge_runs_total", "counter", stats["runs"], "Purge runs"),
+        (
+            "token_purge_removed_total",
+            "counter",
+            stats["removed"],
+            "Expired tokens removed",
+        ),
+        (
+            "token_purge_last_removed",
+            "gauge",
+            stats["last_removed"],
+            "Expired tokens removed by the last run",
+        ),
+        (
+            "token_purge_last_duration_seconds",
+            "gauge",
+            stats["last_seconds"],
+            "Duration of the last run",
+        ),
+    ):
+        lines += [
+            f"# HELP {name} {help_text}",
+            f"# TYPE {name} {metric_type}",
+            f"{name} {value}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    return HttpResponse(
+        registry.render() + render_token_purge(),
+        content_type="text/plain; version=0.0.4",
+    )
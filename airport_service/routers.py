@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+from redis import RedisError
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# sessions are written on login and read right after it
+PRIMARY_ONLY_APPS = ("sessions",)
+
+
+def pin_key(user_id):
+    return f"db-primary-pin-{user_id}"
+
+
+def authenticated_user(request):
+    """The user of the request if it is already known. A lazy user is not
+    evaluated, that would query the database from inside the router."""
+    user = getattr(request, "user", None)
+    if user is None or (
+        isinstance(user, SimpleLazyObject) and user._wrapped is empty
+    ):
+        return None
+    return user if user.is_authenticated else None
+
+
+class RoutingState:
+    def __init__(self, request=None, primary=True):
+        self.request = request
+        self.primary = primary
+        self.pinned_users = {}
+
+    def user_is_pinned(self):
+        """Whether the user of the request wrote something recently"""
+        user = authenticated_user(self.request)
+        if user is None:
+            return False
+        if user.pk not in self.pinned_users:
+            try:
+                pinned = bool(cache.get(pin_key(user.pk)))
+            except RedisError:
+                # recent writes are unknown, read them from the primary
+                pinned = True
+            self.pinned_users[user.pk] = pinned
+        return self.pinned_users[user.pk]
+
+
+# outside of requests (Celery, commands) everything goes to the primary
+routing = ContextVar("db_routing", default=RoutingState())
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, for reads whose result is
+    cached under a version that was just bumped"""
+    state = RoutingState(routing.get().request, primary=True)
+    token = routing.set(state)
+    try:
+        yield
+    finally:
+        routing.reset(token)
+
+
+class ReplicaRouter:
+    """Safe requests read from a random replica, everything else uses
+    the primary: writes, unsafe requests, atomic blocks and users who
+    wrote within DATABASE_REPLICA_LAG seconds, so they read their writes.
+    """
+
+    def __init__(self):
+        self.replicas = [
+            alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS
+        ]
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if (
+            not self.replicas
+            or state.primary
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or state.user_is_pinned()
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Lets safe requests read from replicas, and keeps users on the
+    primary for a while after their successful writes"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routing.set(
+            RoutingState(request, primary=request.method not in SAFE_METHODS)
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = routing.set(
+            RoutingState(request, primary=request.method not in SAFE_METHODS)
+        )
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing.reset(token)
+        self.pin(request, response)
+        return response
+
+    @staticmethod
+    def pin(request, response):
+        if (
+            len(settings.DATABASES) == 1
+            or request.method in SAFE_METHODS
+            or response.status_code >= 400
+        ):
+            return
+        if (user := authenticated_user(request)) is not None:
+            try:
+                cache.set(
+                    pin_key(user.pk), True, settings.DATABASE_REPLICA_LAG
+                )
+            except RedisError:
+                # the write is done, the user may just read a stale replica
+                pass
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+from copy import deepcopy
 from datetime import timedelta
 from pathlib import Path
 
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # libs
     "debug_toolbar",
     "rest_framework",
@@ -64,6 +66,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "airport_service.metrics.MetricsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -71,6 +74,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "airport_service.routers.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "airport_service.urls"
@@ -104,9 +108,48 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "PORT": os.environ.get("POSTGRES_PORT"),
         "HOST": os.environ.get("POSTGRES_HOST", "db"),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Every process keeps a pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE
+# connections, checked before they are handed out. DB_POOL_MAX_SIZE=0
+# turns the pool off in favour of persistent connections per thread,
+# kept for CONN_MAX_AGE seconds (0 connects on every request).
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+
+if DB_POOL_MAX_SIZE:
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": min(
+                int(os.environ.get("DB_POOL_MIN_SIZE", 2)), DB_POOL_MAX_SIZE
+            ),
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.environ.get("CONN_MAX_AGE", 60)
+    )
+
+# Read replicas of the default database as comma separated host[:port].
+# Safe requests read from them, users who wrote something stay on the
+# primary for DATABASE_REPLICA_LAG seconds to see their own changes.
+for index, replica in enumerate(
+    filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(","))
+):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f"replica_{index}"] = {
+        **deepcopy(DATABASES["default"]),
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["airport_service.routers.ReplicaRouter"]
+DATABASE_REPLICA_LAG = float(os.environ.get("DATABASE_REPLICA_LAG", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -151,17 +194,21 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": (
+        "airport_service.metrics.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_PERMISSION_CLASSES": ("airport.permissions.IsAdminOrReadOnly",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "user.authentication.TVJWTAuthentication",
     ),
     "DEFAULT_THROTTLE_CLASSES": (
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "airport_service.throttling.AnonRateThrottle",
+        "airport_service.throttling.UserRateThrottle",
     ),
     "DEFAULT_THROTTLE_RATES": {
-        "anon": "100/hour",
-        "user": "1000/hour",
+        "anon": os.environ.get("THROTTLE_ANON_RATE", "100/hour"),
+        "user": os.environ.get("THROTTLE_USER_RATE", "1000/hour"),
     },
 }
 
@@ -187,3 +234,23 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 
 CELERY_TIME_TASK_LIMIT = 30 * 60
+
+# Reference data and seat maps are cached in the Redis instance used by
+# Celery, unless a separate CACHE_URL is given. Without any Redis URL in the
+# environment the process falls back to a local memory cache.
+CACHE_URL = os.environ.get("CACHE_URL", os.environ.get("CELERY_BROKER_URL"))
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": "airport_service",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
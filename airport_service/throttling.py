@@ -0,0 +1,21 @@
+from redis import RedisError
+from rest_framework import throttling
+
+
+class CacheErrorsAllowMixin:
+    """Lets requests through when the throttle history can't be read,
+    a Redis outage should not fail every request"""
+
+    def allow_request(self, request, view):
+        try:
+            return super().allow_request(request, view)
+        except RedisError:
+            return True
+
+
+class AnonRateThrottle(CacheErrorsAllowMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(CacheErrorsAllowMixin, throttling.UserRateThrottle):
+    pass
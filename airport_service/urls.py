@@ -26,10 +26,13 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from airport_service.metrics import metrics_view
+
 
 urlpatterns = (
     [
         path("admin/", admin.site.urls),
+        path("metrics", metrics_view, name="metrics"),
         path("api/airport/", include("airport.urls", namespace="airport")),
         path("api/user/", include("user.urls", namespace="user")),
         path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
@@ -1,9 +1,19 @@
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from airport_service.routers import use_primary
+from user.cache import cache_user, get_cached_user
 
 
 class TVJWTAuthentication(JWTAuthentication):
+    read_only = False
+
     def authenticate(self, request):
+        # read-only requests may use the cached user without a DB lookup
+        self.read_only = request.method in SAFE_METHODS
         try:
             user, token = super().authenticate(request)
         except TypeError:
@@ -11,3 +21,26 @@ class TVJWTAuthentication(JWTAuthentication):
         if token.get("tv") != user.token_version:
             raise AuthenticationFailed("Token is invalid!!")
         return user, token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            )
+        if self.read_only:
+            user = get_cached_user(user_id)
+            if user is not None:
+                if not user.is_active:
+                    raise AuthenticationFailed(
+                        "User is inactive", code="user_inactive"
+                    )
+                return user
+
+        # the request user is not known yet, so the router would read it
+        # from a replica that may miss a token version reset
+        with use_primary():
+            user = super().get_user(validated_token)
+            cache_user(user)
+        return user
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from redis import RedisError
+
+
+USER_CACHE_TIMEOUT = 5 * 60
+LOCAL_CACHE_TTL = 5
+LOCAL_CACHE_SIZE = 10_000
+CACHED_USER_FIELDS = (
+    "email",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "token_version",
+)
+
+
+class LocalTTLCache:
+    """Per-process LRU cache with a short time to live,
+    put in front of the shared cache to skip the Redis round trip"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (value, time.monotonic() + self.ttl)
+            self.items.move_to_end(key)
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+local_cache = LocalTTLCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+
+
+def user_cache_key(user_id):
+    return f"auth-user-{user_id}"
+
+
+def token_version_key(user_id):
+    return f"auth-user-token-version-{user_id}"
+
+
+def get_cached_user(user_id):
+    """Build an unsaved-looking User from cached fields, or return None.
+    Such user is only good for reading, never save it."""
+    key = user_cache_key(user_id)
+    data = local_cache.get(key)
+    if data is None:
+        try:
+            data = cache.get(key)
+        except RedisError:
+            return None
+        if data is None:
+            return None
+        local_cache.set(key, data)
+    user = get_user_model()(id=user_id, **data)
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+def cache_user(user):
+    """Cache the user read from the database. A user read before
+    a token version reset may be cached after forget_user ran, such
+    entry is dropped again once the newer version is seen."""
+    key = user_cache_key(user.pk)
+    data = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+    try:
+        cache.set(key, data, USER_CACHE_TIMEOUT)
+        version = cache.get(token_version_key(user.pk))
+        if version is not None and version > user.token_version:
+            cache.delete(key)
+            return
+    except RedisError:
+        pass
+    local_cache.set(key, data)
+
+
+def forget_user(user_id, token_version=None):
+    # the version is stored before the entry is deleted,
+    # cache_user checks it after storing the entry
+    key = user_cache_key(user_id)
+    try:
+        if token_version is not None:
+            cache.set(
+                token_version_key(user_id), token_version, USER_CACHE_TIMEOUT
+            )
+        cache.delete(key)
+    except RedisError:
+        pass
+    local_cache.delete(key)
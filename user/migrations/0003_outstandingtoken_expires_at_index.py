@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-17 00:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("user", "0002_user_token_version"),
+        ("token_blacklist", "0013_alter_blacklistedtoken_options_and_more"),
+    ]
+
+    # OutstandingToken belongs to simplejwt, so its index is created by SQL,
+    # concurrently to keep logins writing tokens while it is built
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+            "token_blacklist_outstandingtoken_expires_at_id_idx "
+            "ON token_blacklist_outstandingtoken (expires_at, id)",
+            "DROP INDEX CONCURRENTLY IF EXISTS "
+            "token_blacklist_outstandingtoken_expires_at_id_idx",
+        ),
+    ]
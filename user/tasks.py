@@ -1,7 +1,17 @@
 from celery import shared_task
-from django.core.management import call_command
 
 
 @shared_task
-def flush_invalid_tokens() -> None:
-    call_command("flushexpiredtokens")
+def blacklist_tokens(user_id: int) -> int:
+    # imported here, the module is loaded with celery before the apps
+    from user.tokens import blacklist_user_tokens
+
+    return blacklist_user_tokens(user_id)
+
+
+@shared_task
+def purge_expired_tokens() -> int:
+    from user.tokens import purge_expired_tokens
+
+    removed, _ = purge_expired_tokens()
+    return removed
@@ -1,10 +1,23 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    OutstandingToken,
+    BlacklistedToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from airport_service.routers import ReplicaRouter
+from user.cache import cache_user, get_cached_user
 from user.serializers import UserSerializer
+from user.tokens import purge_expired_tokens, get_purge_stats
 
 
 class TestUser(TestCase):
@@ -37,3 +50,155 @@ class TestUser(TestCase):
             },
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestTokenVersionCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_user(
+            email="user@user.com", password="TestingTest1234"
+        )
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("user:token_obtain_pair"),
+            data={"email": "user@user.com", "password": "TestingTest1234"},
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {response.data['access']}"
+        )
+
+    def test_cached_user_skips_database(self):
+        response = self.client.get(reverse("user:me"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("user:me"))
+        self.assertEqual(response.data["email"], "user@user.com")
+
+    def test_token_reset_invalidates_cached_user(self):
+        self.client.get(reverse("user:me"))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("user:token_reset"))
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+        response = self.client.get(reverse("user:me"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_read_before_reset_is_not_cached(self):
+        user = get_user_model().objects.get(email="user@user.com")
+        stale = get_user_model().objects.get(pk=user.pk)
+        user.token_version += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        cache_user(stale)
+        self.assertIsNone(get_cached_user(user.pk))
+
+
+class TestTokenResetWithReplica(TransactionTestCase):
+    # outside of a test transaction, so safe requests may use replicas
+    def setUp(self):
+        cache.clear()
+        get_user_model().objects.create_user(
+            email="user@user.com", password="TestingTest1234"
+        )
+        self.replica_reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def read_from_replica(router, model, **hints):
+            router.replicas = ["replica_0"]
+            if db_for_read(router, model, **hints) != "default":
+                self.replica_reads.append(model)
+            # the test replica mirrors the primary
+            return "default"
+
+        patcher = mock.patch.object(
+            ReplicaRouter, "db_for_read", read_from_replica
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def obtain_token(self):
+        response = self.client.post(
+            reverse("user:token_obtain_pair"),
+            data={"email": "user@user.com", "password": "TestingTest1234"},
+        )
+        return f"Bearer {response.data['access']}"
+
+    def test_user_is_read_from_primary(self):
+        old_token = self.obtain_token()
+        self.client.credentials(HTTP_AUTHORIZATION=old_token)
+        response = self.client.post(reverse("user:token_reset"))
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+
+        response = self.client.get(reverse("user:me"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=self.obtain_token())
+        response = self.client.get(reverse("user:me"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(get_user_model(), self.replica_reads)
+
+
+class TestResetToken(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@user.com", password="12345"
+        )
+        for _ in range(3):
+            RefreshToken.for_user(self.user)
+        self.expired = OutstandingToken.objects.create(
+            user=self.user,
+            jti="expired",
+            token="expired",
+            expires_at=timezone.now() - timedelta(days=1),
+        )
+        BlacklistedToken.objects.create(
+            token=OutstandingToken.objects.exclude(pk=self.expired.pk).first()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reset_blacklists_live_tokens(self):
+        response = self.client.post(reverse("user:token_reset"))
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+        self.assertEqual(BlacklistedToken.objects.count(), 3)
+        self.assertFalse(
+            BlacklistedToken.objects.filter(token=self.expired).exists()
+        )
+
+    @mock.patch("user.tokens.SYNC_BLACKLIST_LIMIT", 1)
+    @mock.patch("user.views.blacklist_tokens.delay")
+    def test_reset_defers_blacklisting_of_many_tokens(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("user:token_reset"))
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+        delay.assert_called_once_with(self.user.id)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class TestPurgeExpiredTokens(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(
+            email="user@user.com", password="12345"
+        )
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                user=user,
+                jti=f"expired-{i}",
+                token="expired",
+                expires_at=timezone.now() - timedelta(days=1),
+            )
+            BlacklistedToken.objects.create(token=token)
+        RefreshToken.for_user(user)
+
+    def test_purge_in_batches(self):
+        removed, _ = purge_expired_tokens(batch_size=2)
+        self.assertEqual(removed, 5)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertEqual(get_purge_stats()["removed"], 5)
+
+    def test_purge_stops_at_time_budget(self):
+        removed, _ = purge_expired_tokens(batch_size=2, time_budget=0)
+        self.assertEqual(removed, 0)
+        self.assertEqual(OutstandingToken.objects.count(), 6)
+
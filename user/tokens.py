@@ -0,0 +1,106 @@
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from redis import RedisError
+from rest_framework_simplejwt.token_blacklist.models import (
+    OutstandingToken,
+    BlacklistedToken,
+)
+
+
+SYNC_BLACKLIST_LIMIT = 100
+PURGE_BATCH_SIZE = 1000
+PURGE_TIME_BUDGET = 20
+PURGE_STATS_KEY = "token-purge-stats"
+
+logger = logging.getLogger(__name__)
+
+
+def blacklist_user_tokens(user_id):
+    """Blacklist all unexpired, not yet blacklisted refresh tokens
+    of the user with a single INSERT ... SELECT"""
+    outstanding = connection.ops.quote_name(OutstandingToken._meta.db_table)
+    blacklisted = connection.ops.quote_name(BlacklistedToken._meta.db_table)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {blacklisted} (token_id, blacklisted_at) "
+            f"SELECT outstanding.id, %s FROM {outstanding} AS outstanding "
+            f"WHERE outstanding.user_id = %s "
+            f"AND outstanding.expires_at > %s "
+            f"AND NOT EXISTS (SELECT 1 FROM {blacklisted} AS blacklisted "
+            f"WHERE blacklisted.token_id = outstanding.id) "
+            f"ON CONFLICT DO NOTHING",
+            [now, user_id, now],
+        )
+        return cursor.rowcount
+
+
+def has_many_tokens(user_id):
+    """Whether the user has more live tokens than it is fine
+    to blacklist during the request, counts at most the limit + 1"""
+    tokens = OutstandingToken.objects.filter(
+        user_id=user_id,
+        expires_at__gt=timezone.now(),
+        blacklistedtoken__isnull=True,
+    )
+    return tokens.values("id")[: SYNC_BLACKLIST_LIMIT + 1].count() > (
+        SYNC_BLACKLIST_LIMIT
+    )
+
+
+def purge_expired_tokens(
+    batch_size=PURGE_BATCH_SIZE, time_budget=PURGE_TIME_BUDGET
+):
+    """Delete expired outstanding tokens (and their blacklist entries)
+    in short transactions of at most batch_size rows, walking up the
+    primary key, until none are left or time_budget seconds are spent"""
+    started = time.monotonic()
+    now = timezone.now()
+    last_id = 0
+    removed = 0
+    while time.monotonic() - started < time_budget:
+        ids = list(
+            OutstandingToken.objects.filter(id__gt=last_id, expires_at__lt=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            removed += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        last_id = ids[-1]
+
+    seconds = time.monotonic() - started
+    record_purge(removed, seconds)
+    logger.info("Purged %s expired tokens in %.2fs", removed, seconds)
+    return removed, seconds
+
+
+def record_purge(removed, seconds):
+    try:
+        stats = cache.get(PURGE_STATS_KEY) or {"runs": 0, "removed": 0}
+        cache.set(
+            PURGE_STATS_KEY,
+            {
+                "runs": stats["runs"] + 1,
+                "removed": stats["removed"] + removed,
+                "last_removed": removed,
+                "last_seconds": seconds,
+                "last_run": time.time(),
+            },
+            None,
+        )
+    except RedisError:
+        pass
+
+
+def get_purge_stats():
+    try:
+        return cache.get(PURGE_STATS_KEY)
+    except RedisError:
+        return None
@@ -4,20 +4,19 @@ from rest_framework.generics import CreateAPIView, RetrieveUpdateAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.token_blacklist.models import (
-    OutstandingToken,
-    BlacklistedToken,
-)
 
+from airport_service.metrics import TimedSerializationMixin
 from user.serializers import UserSerializer
+from user.tasks import blacklist_tokens
+from user.tokens import blacklist_user_tokens, has_many_tokens
 
 
-class UserCreateView(CreateAPIView):
+class UserCreateView(TimedSerializationMixin, CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = (AllowAny,)
 
 
-class UserManageView(RetrieveUpdateAPIView):
+class UserManageView(TimedSerializationMixin, RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)
 
@@ -29,10 +28,17 @@ class ResetTokenAPIView(APIView):
     permission_classes = (IsAuthenticated,)
 
     def post(self, request, *args, **kwargs):
+        """Revoke all tokens of the user. Access tokens stop working
+        at once by the token version, refresh tokens of users with many
+        of them are blacklisted in background."""
         with transaction.atomic():
             request.user.token_version += 1
             request.user.save()
-            tokens = OutstandingToken.objects.filter(user=request.user)
-            for token in tokens:
-                BlacklistedToken.objects.create(token=token)
+            if has_many_tokens(request.user.id):
+                user_id = request.user.id
+                transaction.on_commit(
+                    lambda: blacklist_tokens.delay(user_id)
+                )
+            else:
+                blacklist_user_tokens(request.user.id)
             return Response(status=status.HTTP_205_RESET_CONTENT)